@@ -1,11 +1,17 @@
 import dash
-from dash import Dash, html, dcc
+from dash import Dash, DiskcacheManager, html, dcc
+import diskcache
 from common.app import style
 
+from data_api.db_config import CALLBACK_CACHE_DIR
+
 
 DIV_STYLE = style.get_div_style()
 
-app = Dash(__name__, use_pages=True)
+# slow page loads run in worker processes instead of holding a server thread
+background_callback_manager = DiskcacheManager(diskcache.Cache(CALLBACK_CACHE_DIR))
+
+app = Dash(__name__, use_pages=True, background_callback_manager=background_callback_manager)
 app.layout = html.Div([
     html.H3('HKEX Quant app'),
     html.Div(children=[
@@ -17,4 +23,7 @@ app.layout = html.Div([
 
 
 if __name__ == '__main__':
+    from data_api.hkex_scheduler import SnapshotScheduler
+    # pages read the latest local snapshots instead of waiting on HKEX
+    SnapshotScheduler.from_index_derivatives().start()
     app.run(port=8051)
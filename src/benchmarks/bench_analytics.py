@@ -0,0 +1,62 @@
+import argparse
+import os
+import tempfile
+
+if __name__ == '__main__':
+    # set before any data_api import so the table runs over a scratch store, as in suite
+    os.environ['EQUITY_DATA_DIR'] = tempfile.mkdtemp(prefix='equity_bench_')
+
+from lib import analytics
+from benchmarks import fixtures
+from benchmarks.timing import time_call
+
+TENORS = ['1m', '2m', '3m', '6m', '1y', '2y']
+NUM_INDICES = 3
+
+def run_regressions(lengths: list[int], universes: list[int], repeat: int = 3) -> list[dict[str, any]]:
+    results = []
+    for length in lengths:
+        for universe in universes:
+            panel = fixtures.get_price_panel(universe + NUM_INDICES, length)
+            index_prices = fixtures.get_price_series(panel.iloc[:, :NUM_INDICES])
+            stock_prices = fixtures.get_price_series(panel.iloc[:, NUM_INDICES:])
+            params = {'length': length, 'universe': universe}
+            loop_s = time_call(analytics.get_beta_matrix, stock_prices, index_prices, repeat=repeat)
+            batch_s = time_call(analytics.get_beta_matrix_batched, stock_prices, index_prices, repeat=repeat)
+            results.append({'benchmark': 'beta_matrix'} | params | {'baseline_s': loop_s, 'optimized_s': batch_s, 'speedup': loop_s / batch_s})
+            loop_s = time_call(analytics.get_autocorrelation, stock_prices, repeat=repeat)
+            batch_s = time_call(analytics.get_autocorrelation_batched, stock_prices, repeat=repeat)
+            results.append({'benchmark': 'autocorrelation'} | params | {'baseline_s': loop_s, 'optimized_s': batch_s, 'speedup': loop_s / batch_s})
+    return results
+
+def run_analytics_table(lengths: list[int], universes: list[int], num_tenors: list[int], repeat: int = 1) -> list[dict[str, any]]:
+    "End to end table over a synthetic store, needs EQUITY_DATA_DIR set to a scratch directory before import"
+    import main
+    results = []
+    for length in lengths:
+        for universe in universes:
+            panel = fixtures.write_price_db(universe, length, num_indices=NUM_INDICES)
+            as_of = panel.index[-1].date()
+            for n_tenors in num_tenors:
+                table_s = time_call(main.get_analytics_table, as_of, TENORS[:n_tenors], repeat=repeat)
+                results.append({'benchmark': 'analytics_table', 'length': length, 'universe': universe,
+                                'tenors': n_tenors, 'optimized_s': table_s})
+    return results
+
+def run(lengths: list[int] = (250, 1000), universes: list[int] = (20, 100), num_tenors: list[int] = (2, 6),
+        repeat: int = 3, with_table: bool = False) -> list[dict[str, any]]:
+    results = run_regressions(lengths, universes, repeat=repeat)
+    if with_table:
+        results += run_analytics_table(lengths, universes, num_tenors)
+    return results
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Beta, autocorrelation and analytics table benchmark')
+    parser.add_argument('--lengths', type=int, nargs='+', default=[250, 1000])
+    parser.add_argument('--universes', type=int, nargs='+', default=[20, 100])
+    parser.add_argument('--tenors', type=int, nargs='+', default=[2, 6])
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--no-table', action='store_true', help='skip the analytics table over a synthetic store')
+    args = parser.parse_args()
+    for res in run(args.lengths, args.universes, args.tenors, args.repeat, with_table=not args.no_table):
+        print(', '.join(f'{k}={v:.4f}' if isinstance(v, float) else f'{k}={v}' for k, v in res.items()))
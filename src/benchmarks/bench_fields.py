@@ -0,0 +1,57 @@
+import argparse
+
+from common.models.market_data import InstrumentDataModel, MarketDataType
+from data_api import hkex_server
+from benchmarks import fixtures
+from benchmarks.timing import time_call
+
+CHAIN_FIELDS = [MarketDataType.LAST, MarketDataType.BID, MarketDataType.ASK, MarketDataType.VOLUME, MarketDataType.PREV_OI]
+
+def get_field_match(data_dict: dict[str, any], datapoint_type: MarketDataType):
+    # previous per call dispatch, kept as the baseline
+    str_to_num = hkex_server.str_to_num
+    match datapoint_type:
+        case MarketDataType.LAST:
+            return str_to_num(data_dict['ls']) if data_dict['ls'] else None
+        case MarketDataType.BID:
+            return str_to_num(data_dict['bd']) if data_dict['bd'] else None
+        case MarketDataType.ASK:
+            return str_to_num(data_dict['as']) if data_dict['as'] else None
+        case MarketDataType.PREV_CLOSE:
+            return str_to_num(data_dict['hc'])
+        case MarketDataType.SETTLE:
+            return str_to_num(data_dict['se']) if data_dict['se'] else None
+        case MarketDataType.VOLUME:
+            return str_to_num(data_dict['vo'], int) if data_dict['vo'] else None
+        case MarketDataType.PREV_OI:
+            return str_to_num(data_dict['oi'], int) if data_dict['oi'] else None
+
+def get_fields_match(rows: list[dict[str, any]], datapoint_types: list[MarketDataType]):
+    res = []
+    for row in rows:
+        row_res = InstrumentDataModel()
+        for dtp in datapoint_types:
+            row_res[dtp] = get_field_match(row, dtp)
+        res.append(row_res)
+    return res
+
+def run(repeat: int = 10, num_strikes: int = 400) -> list[dict[str, any]]:
+    results = []
+    for label, payload in fixtures.get_payloads(hkex_server.OPTION_CHAIN_EP, num_strikes=num_strikes).items():
+        option_list = hkex_server.decode_jsonp(payload)['data']['optionlist']
+        rows = [row[side] for row in option_list for side in ('c', 'p')]
+        assert get_fields_match(rows, CHAIN_FIELDS) == hkex_server.get_fields_list(rows, CHAIN_FIELDS)
+        results.append({
+            'payload': label, 'rows': len(rows),
+            'match_rows_per_s': len(rows) / time_call(get_fields_match, rows, CHAIN_FIELDS, repeat=repeat),
+            'compiled_rows_per_s': len(rows) / time_call(hkex_server.get_fields_list, rows, CHAIN_FIELDS, repeat=repeat),
+            'columnar_rows_per_s': len(rows) / time_call(hkex_server.parse_options_chain_arrays, option_list, repeat=repeat),
+        })
+    return results
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Option chain field extraction benchmark')
+    parser.add_argument('--repeat', type=int, default=10)
+    args = parser.parse_args()
+    for res in run(args.repeat):
+        print(', '.join(f'{k}={v:,.0f}' if isinstance(v, float) else f'{k}={v}' for k, v in res.items()))
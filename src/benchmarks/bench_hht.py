@@ -0,0 +1,37 @@
+import argparse
+
+from lib.hht.emd import EMD
+from lib.hht.eemd import EEMD
+from benchmarks import fixtures
+from benchmarks.timing import time_call
+
+# noisy inputs rarely meet the sifting threshold, so sifting is capped for a fixed amount of work
+MAX_ITERATIONS = 10
+
+def run(lengths: list[int] = (250, 1000), num_trials: int = 20, repeat: int = 3,
+        max_iterations: int = MAX_ITERATIONS) -> list[dict[str, any]]:
+    results = []
+    for length in lengths:
+        series = fixtures.get_imf_series(length)
+        params = {'length': length, 'max_iterations': max_iterations}
+        emd, emd_array = EMD(max_iterations=max_iterations), EMD(max_iterations=max_iterations, vectorized=True)
+        assert emd.decompose(series) == emd_array.decompose(series), f'Vectorized EMD differs from the list path for length {length}'
+        list_s = time_call(emd.decompose, series, repeat=repeat)
+        array_s = time_call(emd_array.decompose, series, repeat=repeat)
+        results.append({'benchmark': 'emd'} | params | {'baseline_s': list_s, 'optimized_s': array_s, 'speedup': list_s / array_s})
+        eemd_params = dict(num_trials=num_trials, max_iterations=max_iterations)
+        list_s = time_call(EEMD(**eemd_params).decompose, series, repeat=1)
+        array_s = time_call(EEMD(batched=True, **eemd_params).decompose, series, repeat=1)
+        results.append({'benchmark': 'eemd', 'num_trials': num_trials} | params |
+                       {'baseline_s': list_s, 'optimized_s': array_s, 'speedup': list_s / array_s})
+    return results
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='EMD and EEMD decomposition benchmark')
+    parser.add_argument('--lengths', type=int, nargs='+', default=[250, 1000])
+    parser.add_argument('--trials', type=int, default=20)
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--max-iterations', type=int, default=MAX_ITERATIONS)
+    args = parser.parse_args()
+    for res in run(args.lengths, args.trials, args.repeat, args.max_iterations):
+        print(', '.join(f'{k}={v:.4f}' if isinstance(v, float) else f'{k}={v}' for k, v in res.items()))
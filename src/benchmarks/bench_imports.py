@@ -0,0 +1,61 @@
+import argparse
+import os
+import subprocess
+import sys
+import time
+
+SRC_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DEFAULT_MODULES = ('data_api.hkex_server', 'data_api.hkex_client', 'lib.analytics', 'market.hk_equity', 'market.hk_eq_vol', 'main', 'app')
+HEAVY_PACKAGES = ('pandas', 'scipy', 'statsmodels', 'bs4', 'regex', 'plotly', 'dash', 'volatility')
+IMPORT_TIME_PREFIX = 'import time:'
+NUM_TOP = 10
+
+def parse_import_times(stderr: str) -> list[tuple[int, str, float]]:
+    "Nesting level, module and cumulative seconds from the -X importtime output"
+    entries = []
+    for line in stderr.splitlines():
+        if not line.startswith(IMPORT_TIME_PREFIX):
+            continue
+        _, cumulative, name = line[len(IMPORT_TIME_PREFIX):].split('|')
+        if not cumulative.strip().isdigit():
+            continue
+        level = (len(name) - len(name.lstrip()) - 1) // 2
+        entries.append((level, name.strip(), int(cumulative) / 1e6))
+    return entries
+
+def get_import_report(module: str) -> dict[str, any]:
+    "Import time, loaded heavy packages and peak memory of a fresh interpreter importing the module"
+    code = f'import resource\nimport {module}\nprint(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss)'
+    start = time.perf_counter()
+    proc = subprocess.run([sys.executable, '-X', 'importtime', '-c', code], cwd=SRC_DIR, capture_output=True, text=True)
+    wall_s = time.perf_counter() - start
+    entries = parse_import_times(proc.stderr)
+    if proc.returncode != 0:
+        return {'module': module, 'error': proc.stderr.strip().splitlines()[-1]}
+    module_s = next((cumulative for _, name, cumulative in entries if name == module), None)
+    loaded = {name.split('.')[0] for _, name, _ in entries}
+    top = sorted(((name, cumulative) for level, name, cumulative in entries if level == 1), key=lambda e: -e[1])
+    return {
+        'module': module, 'wall_s': wall_s, 'import_s': module_s,
+        'max_rss_mb': int(proc.stdout.split()[-1]) / 1024,
+        'heavy': [pkg for pkg in HEAVY_PACKAGES if pkg in loaded],
+        'top': dict(top[:NUM_TOP]),
+    }
+
+def run(modules: list[str] = DEFAULT_MODULES) -> list[dict[str, any]]:
+    return [get_import_report(module) for module in modules]
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Import time and memory of the app and script entry modules')
+    parser.add_argument('--modules', nargs='+', default=list(DEFAULT_MODULES))
+    parser.add_argument('--top', action='store_true', help='list the slowest imports of each module')
+    args = parser.parse_args()
+    for res in run(args.modules):
+        if 'error' in res:
+            print(f"{res['module']}: {res['error']}")
+            continue
+        import_s = f"{res['import_s']:.3f}s" if res['import_s'] is not None else 'n/a'
+        print(f"{res['module']}: import={import_s}, wall={res['wall_s']:.3f}s, rss={res['max_rss_mb']:.0f}MB, heavy={','.join(res['heavy']) or '-'}")
+        if args.top:
+            for name, cumulative in res['top'].items():
+                print(f'    {name}: {cumulative:.3f}s')
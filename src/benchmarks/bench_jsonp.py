@@ -0,0 +1,42 @@
+import argparse
+import json
+import regex
+
+from data_api import hkex_server
+from benchmarks import fixtures
+from benchmarks.timing import time_call
+
+def decode_regex(payload: bytes):
+    # previous path: decode, scan the full text with a regex, then parse the copy
+    text_json = regex.search(f"{hkex_server.JSONP_CALLBACK}\\((.*)\\)", payload.decode()).group(1)
+    return json.loads(text_json)
+
+def record_defaults():
+    fixtures.record_payload(hkex_server.HISTORY_EP, {'span': hkex_server.SPAN_MAP['1d'], 'int': hkex_server.INTERVAL_MAP['10y'], 'ric': '.HSI'}, 'HSI_10y')
+    fixtures.record_payload(hkex_server.FUTURES_EP, {'ats': 'HSI', 'type': 0}, 'HSI')
+    fixtures.record_payload(hkex_server.OPTION_CHAIN_EP, {'ats': 'HSI', 'con': '', 'type': 0, 'fr': 'null', 'to': 'null'}, 'HSI')
+
+def run(repeat: int = 20) -> list[dict[str, any]]:
+    results = []
+    for endpoint in fixtures.SYNTHETIC_PAYLOADS:
+        for label, payload in fixtures.get_payloads(endpoint).items():
+            assert decode_regex(payload) == hkex_server.decode_jsonp(payload), f'{label} decoding mismatch'
+            result = {
+                'endpoint': endpoint, 'payload': label, 'size_kb': len(payload) / 1024,
+                'regex_ms': time_call(decode_regex, payload, repeat=repeat) * 1e3,
+                'offsets_json_ms': time_call(hkex_server.decode_jsonp, payload, use_orjson=False, repeat=repeat) * 1e3,
+            }
+            if hkex_server.orjson:
+                result['offsets_orjson_ms'] = time_call(hkex_server.decode_jsonp, payload, repeat=repeat) * 1e3
+            results.append(result)
+    return results
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='JSONP decoding micro-benchmark')
+    parser.add_argument('--repeat', type=int, default=20)
+    parser.add_argument('--record', action='store_true', help='capture live payloads into benchmarks/recorded first')
+    args = parser.parse_args()
+    if args.record:
+        record_defaults()
+    for res in run(args.repeat):
+        print(', '.join(f'{k}={v:.3f}' if isinstance(v, float) else f'{k}={v}' for k, v in res.items()))
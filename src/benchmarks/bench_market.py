@@ -0,0 +1,54 @@
+import argparse
+import numpy as np
+import pandas as pd
+
+from lib.interpolator import Spline3D
+from market import hk_equity
+from benchmarks import fixtures
+from benchmarks.timing import time_call
+
+NUM_EXPIRIES = 8
+MESH_EXPIRIES = 50
+
+def compute_futures_spreads_loop(index_ticks: pd.Series, futures_ticks: dict[str, pd.Series], hedge_ratios: dict[str, float]):
+    # previous per tick path, kept as the baseline
+    spots_data, spreads_data = {}, {}
+    for fut_key, future_ticks in futures_ticks.items():
+        hedge_ratio = hedge_ratios[fut_key]
+        spots_data[f'{fut_key} Spot'] = pd.Series({k: v / hedge_ratio for k, v in future_ticks.items()})
+        spreads_data[fut_key] = future_ticks.combine(index_ticks, lambda x, y: x / y - 1).dropna()
+    return spots_data, spreads_data
+
+def run_spreads(lengths: list[int], repeat: int = 3) -> list[dict[str, any]]:
+    results = []
+    for length in lengths:
+        ticks = fixtures.get_futures_ticks(length)
+        loop_s = time_call(compute_futures_spreads_loop, *ticks, repeat=repeat)
+        array_s = time_call(hk_equity.compute_futures_spreads, *ticks, repeat=repeat)
+        results.append({'benchmark': 'futures_spreads', 'length': length, 'baseline_s': loop_s, 'optimized_s': array_s, 'speedup': loop_s / array_s})
+    return results
+
+def run_spline(strikes: list[int], repeat: int = 3) -> list[dict[str, any]]:
+    results = []
+    for num_strikes in strikes:
+        points = fixtures.get_surface_points(NUM_EXPIRIES, num_strikes)
+        build_s = time_call(Spline3D, points, repeat=repeat)
+        spline = Spline3D(points)
+        xs, ys = np.linspace(0.05, 2, MESH_EXPIRIES), np.linspace(0.6, 1.4, num_strikes)
+        point_s = time_call(lambda: [[spline.get_value(x, y) for y in ys] for x in xs], repeat=repeat)
+        grid_s = time_call(spline.get_values, xs, ys, repeat=repeat)
+        results.append({'benchmark': 'spline3d', 'strikes': num_strikes, 'expiries': NUM_EXPIRIES, 'build_s': build_s,
+                        'baseline_s': point_s, 'optimized_s': grid_s, 'speedup': point_s / grid_s})
+    return results
+
+def run(lengths: list[int] = (250, 1000), strikes: list[int] = (50, 200), repeat: int = 3) -> list[dict[str, any]]:
+    return run_spreads(lengths, repeat=repeat) + run_spline(strikes, repeat=repeat)
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Futures spread and vol surface spline benchmark')
+    parser.add_argument('--lengths', type=int, nargs='+', default=[250, 1000])
+    parser.add_argument('--strikes', type=int, nargs='+', default=[50, 200])
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+    for res in run(args.lengths, args.strikes, args.repeat):
+        print(', '.join(f'{k}={v:.4f}' if isinstance(v, float) else f'{k}={v}' for k, v in res.items()))
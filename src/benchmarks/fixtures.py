@@ -0,0 +1,164 @@
+import datetime as dtm
+import glob
+import json
+import os
+import sqlite3
+import numpy as np
+import pandas as pd
+
+from data_api import hkex_server
+from data_api.db_config import DATA_DIR, DEFAULT_DATA_DIR, META_DB, PRICES_DB
+from data_api.hkex_config import EQUITY_TABLE, INDEX_TABLE, HISTORY_TABLE
+
+RECORDED_DIR = os.path.join(os.path.dirname(__file__), 'recorded')
+JSONP_EXT = '.jsonp'
+
+def wrap_jsonp(data: dict[str, any]) -> bytes:
+    body = json.dumps({'data': {'responsecode': hkex_server.SUCCESS_CODE} | data})
+    return f'{hkex_server.JSONP_CALLBACK}({body});'.encode()
+
+def format_num(value: float, decimals: int = 2) -> str:
+    return f'{value:,.{decimals}f}'
+
+def get_chart_payload(num_points: int = 2500, seed: int = 1) -> bytes:
+    rng = np.random.default_rng(seed)
+    start_ts = int(dtm.datetime(2015, 1, 2).timestamp() * 1000)
+    closes = 20000 * np.exp(np.cumsum(rng.normal(0, 0.01, num_points)))
+    rows = [[start_ts + i * 86400000, c * 0.99, c * 1.01, c * 0.98, c, int(v), int(v * c)]
+            for i, (c, v) in enumerate(zip(closes, rng.integers(1e5, 1e7, num_points)))]
+    # the first and last rows are dropped by get_chart_data
+    return wrap_jsonp({'datalist': [None] + rows + [None]})
+
+def get_quote_fields(rng: np.random.Generator, price: float) -> dict[str, str]:
+    spread = max(price * 0.02, 1)
+    active = rng.random() > 0.2
+    return {
+        'ls': format_num(price) if active else '',
+        'bd': format_num(price - spread / 2) if active else '',
+        'as': format_num(price + spread / 2) if active else '',
+        'vo': format_num(rng.integers(0, 5000), 0) if active else '',
+        'oi': format_num(rng.integers(0, 50000), 0),
+        'hc': format_num(price),
+        'se': format_num(price),
+    }
+
+def get_options_payload(num_strikes: int = 400, seed: int = 1) -> bytes:
+    rng = np.random.default_rng(seed)
+    spot, strike_step = 20000, 100
+    option_list = []
+    for i in range(num_strikes):
+        strike = spot + (i - num_strikes // 2) * strike_step
+        call_price = max(spot - strike, 0) + 200 * np.exp(-abs(spot - strike) / 3000)
+        put_price = max(strike - spot, 0) + 200 * np.exp(-abs(spot - strike) / 3000)
+        option_list.append({
+            'strike': format_num(strike, 0),
+            'c': get_quote_fields(rng, call_price),
+            'p': get_quote_fields(rng, put_price),
+        })
+    return wrap_jsonp({'lastupd': '02/01/2025 16:30', 'optionlist': option_list})
+
+def get_futures_payload(num_contracts: int = 6, seed: int = 1) -> bytes:
+    rng = np.random.default_rng(seed)
+    futures_list = []
+    for i in range(num_contracts):
+        contract_date = dtm.date(2025, 1 + i % 12, 1)
+        futures_list.append({
+            'con': contract_date.strftime('%b-%y').upper(),
+            'ric': f'HSI{contract_date.strftime("%m%y")}',
+        } | get_quote_fields(rng, 20000 + 50 * i))
+    return wrap_jsonp({'lastupd': '02/01/2025 16:30', 'futureslist': futures_list})
+
+SYNTHETIC_PAYLOADS = {
+    hkex_server.HISTORY_EP: get_chart_payload,
+    hkex_server.OPTION_CHAIN_EP: get_options_payload,
+    hkex_server.FUTURES_EP: get_futures_payload,
+}
+
+def load_recorded(endpoint: str) -> dict[str, bytes]:
+    payloads = {}
+    for path in sorted(glob.glob(os.path.join(RECORDED_DIR, f'{endpoint}*{JSONP_EXT}'))):
+        with open(path, 'rb') as f:
+            payloads[os.path.basename(path)] = f.read()
+    return payloads
+
+def get_payloads(endpoint: str, **kwargs) -> dict[str, bytes]:
+    "Recorded payloads for the endpoint, or a synthetic one if none were captured"
+    return load_recorded(endpoint) or {'synthetic': SYNTHETIC_PAYLOADS[endpoint](**kwargs)}
+
+def record_payload(endpoint: str, params: dict[str, any], label: str) -> str:
+    session = hkex_server.WIDGET_SESSION
+    token = session.token or session.refresh_token()
+    request_params = params | {'token': token, 'lang': 'eng', 'qid': 0, 'callback': hkex_server.JSONP_CALLBACK}
+    payload = session.url_get_content(hkex_server.DATA_URL + endpoint, params=request_params)
+    path = os.path.join(RECORDED_DIR, f'{endpoint}_{label}{JSONP_EXT}')
+    with open(path, 'wb') as f:
+        f.write(payload)
+    return path
+
+
+def get_price_panel(num_series: int, num_days: int, seed: int = 1, missing: float = 0.02) -> pd.DataFrame:
+    "Business day price paths with a common factor and random gaps"
+    rng = np.random.default_rng(seed)
+    dates = pd.bdate_range(end=dtm.date(2025, 1, 3), periods=num_days)
+    market = rng.normal(0, 0.01, (num_days, 1))
+    returns = market * rng.uniform(0.5, 1.5, num_series) + rng.normal(0, 0.015, (num_days, num_series))
+    prices = 100 * np.exp(np.cumsum(returns, axis=0))
+    prices[rng.random(prices.shape) < missing] = np.nan
+    return pd.DataFrame(prices, index=dates, columns=[f'{i:04d}.HK' for i in range(1, num_series + 1)])
+
+def get_price_series(panel: pd.DataFrame) -> dict[str, pd.Series]:
+    return {col: panel[col].dropna() for col in panel.columns}
+
+def write_price_db(num_stocks: int, num_days: int, num_indices: int = 3, seed: int = 1) -> pd.DataFrame:
+    "Replaces the meta and prices stores under db_config.DATA_DIR with a synthetic universe"
+    if os.path.abspath(DATA_DIR) == os.path.abspath(DEFAULT_DATA_DIR):
+        raise RuntimeError(f'Refusing to replace the stores in {DATA_DIR}, set EQUITY_DATA_DIR to a scratch directory')
+    panel = get_price_panel(num_stocks + num_indices, num_days, seed=seed)
+    index_rics = [f'.IDX{i}' for i in range(num_indices)]
+    panel.columns = index_rics + list(panel.columns[num_indices:])
+    # indices trade every day so the last stored date is the panel end
+    panel[index_rics] = panel[index_rics].ffill().bfill()
+    for db_path in (META_DB, PRICES_DB):
+        os.makedirs(os.path.dirname(db_path) or '.', exist_ok=True)
+        if os.path.exists(db_path):
+            os.remove(db_path)
+    with sqlite3.connect(META_DB) as conn:
+        conn.execute(f"CREATE TABLE {EQUITY_TABLE} (stock_id TEXT, ric TEXT, currency TEXT, name TEXT, industry TEXT, "
+                     "lot_size INTEGER, tick_size REAL, issued_shares INTEGER, dividend_yield REAL)")
+        conn.execute(f"CREATE TABLE {INDEX_TABLE} (index_id TEXT, ric TEXT, currency TEXT, name TEXT)")
+        conn.executemany(f"INSERT INTO {INDEX_TABLE} VALUES (?, ?, 'HKD', ?)", [(r[1:], r, r[1:]) for r in index_rics])
+        conn.executemany(f"INSERT INTO {EQUITY_TABLE} (stock_id, ric, currency, name) VALUES (?, ?, 'HKD', ?)",
+                         [(r[:4], r, f'Stock {r[:4]}') for r in panel.columns[num_indices:]])
+    history = panel.stack().reset_index()
+    history.columns = ['date', 'ric', 'close']
+    with sqlite3.connect(PRICES_DB) as conn:
+        conn.execute(f"CREATE TABLE {HISTORY_TABLE} (instrument_id TEXT, date TEXT, open REAL, high REAL, low REAL, "
+                     f"close REAL, volume INTEGER, turnover INTEGER, CONSTRAINT {HISTORY_TABLE}_pk PRIMARY KEY (instrument_id, date))")
+        conn.executemany(f"INSERT INTO {HISTORY_TABLE} VALUES (?, ?, ?, ?, ?, ?, 0, 0)",
+                         [(ric, d.strftime('%Y-%m-%d'), c, c, c, c) for d, ric, c in history.itertuples(index=False)])
+    return panel
+
+def get_imf_series(length: int, seed: int = 1) -> dict[int, float]:
+    "Two cycles and a trend with noise, as EMD input"
+    rng = np.random.default_rng(seed)
+    xs = np.arange(length)
+    ys = np.sin(2 * np.pi * xs / 20) + 0.5 * np.sin(2 * np.pi * xs / 90) + xs / length + rng.normal(0, 0.1, length)
+    return dict(zip(xs.tolist(), ys.tolist()))
+
+def get_futures_ticks(num_ticks: int, num_futures: int = 2, seed: int = 1) -> tuple[pd.Series, dict[str, pd.Series], dict[str, float]]:
+    rng = np.random.default_rng(seed)
+    times = pd.date_range(dtm.datetime(2025, 1, 3, 9, 30), periods=num_ticks, freq='min')
+    index_ticks = pd.Series(20000 * np.exp(np.cumsum(rng.normal(0, 5e-4, num_ticks))), index=times)
+    futures_ticks, hedge_ratios = {}, {}
+    for i in range(num_futures):
+        fut_key = f'HSI F{i + 1}'
+        # futures tick on a random subset of the index times
+        ticks = index_ticks * (1.001 + 0.001 * i) * np.exp(rng.normal(0, 1e-4, num_ticks))
+        futures_ticks[fut_key] = ticks[rng.random(num_ticks) < 0.9]
+        hedge_ratios[fut_key] = 1.001 + 0.001 * i
+    return index_ticks, futures_ticks, hedge_ratios
+
+def get_surface_points(num_expiries: int, num_strikes: int) -> list[tuple[float, float, float]]:
+    expiries = np.linspace(0.05, 2, num_expiries)
+    strikes = np.linspace(0.6, 1.4, num_strikes)
+    return [(t, k, 0.2 + 0.15 * (k - 1) ** 2 / np.sqrt(t) - 0.02 * t) for t in expiries for k in strikes]
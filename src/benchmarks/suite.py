@@ -0,0 +1,75 @@
+import argparse
+import datetime as dtm
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+
+RESULTS_DIR = os.path.join(os.path.dirname(__file__), 'results')
+GROUPS = ('hht', 'analytics', 'chain', 'jsonp', 'market', 'imports')
+
+def get_environment() -> dict[str, str]:
+    import numpy as np
+    import pandas as pd
+    try:
+        commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                                cwd=os.path.dirname(__file__)).stdout.strip()
+    except OSError:
+        commit = None
+    return {
+        'python': sys.version.split()[0], 'platform': platform.platform(), 'processor': platform.processor(),
+        'cpu_count': os.cpu_count(), 'numpy': np.__version__, 'pandas': pd.__version__, 'commit': commit,
+    }
+
+def run_suite(groups: list[str], lengths: list[int], universes: list[int], num_tenors: list[int],
+              strikes: list[int], num_trials: int, repeat: int) -> list[dict[str, any]]:
+    from benchmarks import bench_analytics, bench_fields, bench_hht, bench_imports, bench_jsonp, bench_market
+    results = []
+    if 'hht' in groups:
+        results += bench_hht.run(lengths, num_trials=num_trials, repeat=repeat)
+    if 'analytics' in groups:
+        results += bench_analytics.run(lengths, universes, num_tenors, repeat=repeat, with_table=True)
+    if 'chain' in groups:
+        for num_strikes in strikes:
+            results += [{'benchmark': 'options_chain', 'strikes': num_strikes} | res
+                        for res in bench_fields.run(repeat=repeat, num_strikes=num_strikes)]
+    if 'jsonp' in groups:
+        results += [{'benchmark': 'jsonp'} | res for res in bench_jsonp.run(repeat=repeat)]
+    if 'market' in groups:
+        results += bench_market.run(lengths, strikes, repeat=repeat)
+    if 'imports' in groups:
+        results += [{'benchmark': 'imports'} | res for res in bench_imports.run()]
+    return results
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Benchmark suite writing a JSON results file')
+    parser.add_argument('--groups', nargs='+', choices=GROUPS, default=list(GROUPS))
+    parser.add_argument('--lengths', type=int, nargs='+', default=[250, 1000], help='series length in points')
+    parser.add_argument('--universes', type=int, nargs='+', default=[20, 100], help='number of stocks')
+    parser.add_argument('--tenors', type=int, nargs='+', default=[2, 6], help='number of analytics tenors')
+    parser.add_argument('--strikes', type=int, nargs='+', default=[50, 400], help='option chain and surface strikes')
+    parser.add_argument('--trials', type=int, default=20, help='EEMD ensemble size')
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--data-dir', help='scratch directory for the synthetic stores, a new temporary one by default')
+    parser.add_argument('--output', help=f'results file, under {RESULTS_DIR} by default')
+    args = parser.parse_args()
+    # set before any data_api import so db_config points at the synthetic stores
+    os.environ['EQUITY_DATA_DIR'] = args.data_dir or tempfile.mkdtemp(prefix='equity_bench_')
+    started = dtm.datetime.now()
+    results = run_suite(args.groups, args.lengths, args.universes, args.tenors, args.strikes, args.trials, args.repeat)
+    report = {
+        'started': started.isoformat(timespec='seconds'),
+        'elapsed_s': (dtm.datetime.now() - started).total_seconds(),
+        'environment': get_environment(),
+        'parameters': {k: v for k, v in vars(args).items() if k not in ('output', 'data_dir')},
+        'results': results,
+    }
+    output = args.output or os.path.join(RESULTS_DIR, f'bench_{started:%Y%m%d_%H%M%S}.json')
+    os.makedirs(os.path.dirname(output) or '.', exist_ok=True)
+    with open(output, 'w') as f:
+        json.dump(report, f, indent=2, default=str)
+    for res in results:
+        print(', '.join(f'{k}={v:.4g}' if isinstance(v, float) else f'{k}={v}' for k, v in res.items()))
+    print(f'Results written to {output}')
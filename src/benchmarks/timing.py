@@ -0,0 +1,6 @@
+import timeit
+
+
+def time_call(func, *args, repeat: int = 5, number: int = 1, **kwargs) -> float:
+    "Best wall time in seconds of a single call over the repeats"
+    return min(timeit.repeat(lambda: func(*args, **kwargs), repeat=repeat, number=number)) / number
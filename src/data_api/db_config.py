@@ -1,2 +1,15 @@
-META_DB = 'data/equity_meta.db'
-PRICES_DB = 'data/equity_closes.db'
+import os
+
+# root of the local stores, overridden to point the app or benchmarks at another data set
+DEFAULT_DATA_DIR = 'data'
+DATA_DIR = os.environ.get('EQUITY_DATA_DIR', DEFAULT_DATA_DIR)
+
+META_DB = f'{DATA_DIR}/equity_meta.db'
+PRICES_DB = f'{DATA_DIR}/equity_closes.db'
+INTRADAY_DB = f'{DATA_DIR}/equity_intraday.db'
+RATES_DB = f'{DATA_DIR}/rates.db'
+TICKS_DIR = f'{DATA_DIR}/ticks'
+RESULT_CACHE_DB = f'{DATA_DIR}/result_cache.db'
+CALLBACK_CACHE_DIR = f'{DATA_DIR}/callback_cache'
+REPLAY_DIR = f'{DATA_DIR}/replay'
+TIMING_DIR = f'{DATA_DIR}/timing'
@@ -1,5 +1,11 @@
 import datetime as dtm
-from common import request_web
+import json
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+from common import request_web, sql
+from data_api.db_config import RATES_DB
+from data_api.replay_server import get_site_url
 
 TENORS = {
     'Overnight': '1d',
@@ -11,9 +17,110 @@ TENORS = {
     '6 Months': '6m',
     '12 Months': '12m',
 }
-HIBOR_URL = "https://www.hkab.org.hk/api/hibor?year={year}&month={month}&day={day}"
+HIBOR_URL = get_site_url("https://www.hkab.org.hk/api/hibor?year={year}&month={month}&day={day}")
+# local JSON file of {iso date: HKAB response} used instead of the endpoint when set
+HIBOR_FIXTURE = os.environ.get('HIBOR_FIXTURE')
+
+def get_fixture_rates(as_of: dtm.date, fixture_path: str = None) -> dict[str, any]:
+    with open(fixture_path or HIBOR_FIXTURE) as f:
+        return json.load(f).get(as_of.isoformat(), {})
+
 def get_rates(as_of: dtm.date) -> dict[str, float]:
-    rates_url = HIBOR_URL.format(year=as_of.year, month=as_of.month, day=as_of.day)
-    rates_data_raw = request_web.get_json(request_web.url_get(rates_url))
+    if HIBOR_FIXTURE:
+        rates_data_raw = get_fixture_rates(as_of)
+    else:
+        rates_url = HIBOR_URL.format(year=as_of.year, month=as_of.month, day=as_of.day)
+        rates_data_raw = request_web.get_json(request_web.url_get(rates_url))
     rates_data = {TENORS[k]: float(v) for k, v in rates_data_raw.items() if k in TENORS and v is not None}
     return rates_data
+
+
+HIBOR_TABLE = 'hibor_fixings'
+MAX_FALLBACK_DAYS = 10
+RATES_TABLE_CREATED = False
+# past dates already requested without a fixing, such as holidays
+MISSING_DATES: set[dtm.date] = set()
+
+def add_missing_date(as_of: dtm.date):
+    # today's fixing may not be published yet
+    if as_of < dtm.date.today():
+        MISSING_DATES.add(as_of)
+
+def is_fetchable(as_of: dtm.date) -> bool:
+    return as_of.weekday() < 5 and as_of not in MISSING_DATES and as_of <= dtm.date.today()
+
+def create_rates_table():
+    global RATES_TABLE_CREATED
+    if RATES_TABLE_CREATED:
+        return
+    create_query = f"CREATE TABLE IF NOT EXISTS {HIBOR_TABLE} ("\
+    "date TEXT, tenor TEXT, rate REAL, "\
+    f"CONSTRAINT {HIBOR_TABLE}_pk PRIMARY KEY (date, tenor));"
+    sql.modify(create_query, RATES_DB)
+    RATES_TABLE_CREATED = True
+
+def save_rates(as_of: dtm.date, rates: dict[str, float]):
+    create_rates_table()
+    if not rates:
+        return False
+    date_str = as_of.strftime(sql.DATE_FORMAT)
+    insert_rows = [f"\n('{date_str}', '{tenor}', {rate})" for tenor, rate in rates.items()]
+    insert_query = f"INSERT OR REPLACE INTO {HIBOR_TABLE} VALUES {','.join(insert_rows)};"
+    return sql.modify(insert_query, RATES_DB)
+
+def get_stored_dates(from_date: dtm.date, to_date: dtm.date) -> set[dtm.date]:
+    create_rates_table()
+    select_query = f"SELECT DISTINCT date FROM {HIBOR_TABLE} WHERE "\
+    f"date>='{from_date.strftime(sql.DATE_FORMAT)}' AND date<='{to_date.strftime(sql.DATE_FORMAT)}'"
+    return {dtm.datetime.strptime(row[0], sql.DATE_FORMAT).date() for row in sql.fetch(select_query, RATES_DB)}
+
+def load_stored_rates(as_of: dtm.date, max_fallback_days: int = MAX_FALLBACK_DAYS) -> tuple[dtm.date, dict[str, float]]:
+    "Latest stored fixing on or before as_of within the fallback window"
+    create_rates_table()
+    from_str = (as_of - dtm.timedelta(days=max_fallback_days)).strftime(sql.DATE_FORMAT)
+    select_query = f"SELECT date, tenor, rate FROM {HIBOR_TABLE} WHERE date=(SELECT MAX(date) FROM {HIBOR_TABLE} "\
+    f"WHERE date<='{as_of.strftime(sql.DATE_FORMAT)}' AND date>='{from_str}')"
+    select_res = sql.fetch(select_query, RATES_DB)
+    if not select_res:
+        return None, {}
+    return dtm.datetime.strptime(select_res[0][0], sql.DATE_FORMAT).date(), {row[1]: row[2] for row in select_res}
+
+def fetch_and_save_rates(as_of: dtm.date) -> dict[str, float]:
+    rates = get_rates(as_of)
+    if rates:
+        save_rates(as_of, rates)
+    else:
+        add_missing_date(as_of)
+    return rates
+
+def backfill_rates(from_date: dtm.date, to_date: dtm.date, max_workers: int = 4) -> int:
+    stored_dates = get_stored_dates(from_date, to_date)
+    fetch_dates = [from_date + dtm.timedelta(days=d) for d in range((to_date - from_date).days + 1)]
+    fetch_dates = [d for d in fetch_dates if d not in stored_dates and is_fetchable(d)]
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        fetched = list(executor.map(get_rates, fetch_dates))
+    # single writer for the SQLite store
+    num_saved = 0
+    for as_of, rates in zip(fetch_dates, fetched):
+        if rates:
+            save_rates(as_of, rates)
+            num_saved += 1
+        else:
+            add_missing_date(as_of)
+    return num_saved
+
+def get_fixing(as_of: dtm.date) -> tuple[dtm.date, dict[str, float]]:
+    "Date and rates of the latest fixing on or before as_of, walking back through unstored business days"
+    stored_date, stored_rates = load_stored_rates(as_of)
+    for d in range(MAX_FALLBACK_DAYS + 1):
+        fixing_date = as_of - dtm.timedelta(days=d)
+        if fixing_date == stored_date:
+            return stored_date, stored_rates
+        if is_fetchable(fixing_date):
+            rates = fetch_and_save_rates(fixing_date)
+            if rates:
+                return fixing_date, rates
+    raise ValueError(f'No HIBOR fixing found within {MAX_FALLBACK_DAYS} days of {as_of}')
+
+def get_fixing_rates(as_of: dtm.date) -> dict[str, float]:
+    return get_fixing(as_of)[1]
@@ -1,107 +1,305 @@
 import datetime as dtm
+from typing import TYPE_CHECKING
+import logging
+import sys
+from concurrent.futures import ThreadPoolExecutor, as_completed
 
 from common import sql
 from common.models.data_series import DataSeries
+from common.models.base_instrument import BaseInstrument
 from common.models.market_data import SessionType
 
-from data_api.db_config import META_DB, PRICES_DB
+from data_api.db_config import META_DB, PRICES_DB, INTRADAY_DB
 from data_api.hkex_config import *
-from data_api import hkex_server
+from data_api import hkex_server, tick_store
+from data_api.rate_limit import RateLimiter, call_with_retry
 from instruments.stock import Stock
 from instruments.equity_index import EquityIndex, EquityIndexFuture
+from lib import timing
+
+if TYPE_CHECKING:
+    # pandas is only needed for history panels, update jobs start without it
+    import pandas as pd
+
+logger = logging.Logger(__name__)
+
+# queries are timed per calling function, e.g. sql.fetch.get_history_panel
+def sql_fetch(query: str, db: str, **kwargs):
+    with timing.timed(f'sql.fetch.{sys._getframe(1).f_code.co_name}'):
+        return sql.fetch(query, db, **kwargs)
+
+def sql_modify(query: str, db: str):
+    with timing.timed(f'sql.modify.{sys._getframe(1).f_code.co_name}'):
+        return sql.modify(query, db)
 
 def get_components(id: str):
     select_query = f"SELECT component_id FROM {INDEX_COMPOSITION_TABLE} WHERE index_id='{id}'"
-    select_res = sql.fetch(select_query, META_DB)
+    select_res = sql_fetch(select_query, META_DB)
     index_components = [row[0] for row in select_res]
     return index_components
 
-def get_stocks(load_data: bool = False) -> list[Stock]:
+def get_stocks(load_data: bool = False, from_date: dtm.date = None, to_date: dtm.date = None) -> list[Stock]:
     select_query = f"SELECT ric, name FROM {EQUITY_TABLE}"
-    select_res = sql.fetch(select_query, META_DB)
+    select_res = sql_fetch(select_query, META_DB)
     instruments = []
     for row in select_res:
         stock = Stock(data_id=row[0], name=row[1])
-        if load_data:
-            stock._data_series = get_history(stock.data_id)
         instruments.append(stock)
+    if load_data:
+        load_histories(instruments, from_date=from_date, to_date=to_date)
     return instruments
 
-def get_indices(load_data: bool = False) -> list[EquityIndex]:
+def get_indices(load_data: bool = False, from_date: dtm.date = None, to_date: dtm.date = None) -> list[EquityIndex]:
     index_query = f"SELECT ric, name FROM {INDEX_TABLE}"
-    index_res = sql.fetch(index_query, META_DB)
+    index_res = sql_fetch(index_query, META_DB)
     instruments = []
     for row in index_res:
         index = EquityIndex(data_id=row[0], name=row[1])
-        if load_data:
-            index._data_series = get_history(index.data_id)
         instruments.append(index)
+    if load_data:
+        load_histories(instruments, from_date=from_date, to_date=to_date)
     return instruments
 
-def get_index_derivatives(load_data: bool = False) -> list[EquityIndex]:
+def get_index_derivatives(load_data: bool = False, from_date: dtm.date = None, to_date: dtm.date = None) -> list[EquityIndex]:
     select_query = f"SELECT t1.ric, t1.name, t2.future_id FROM {INDEX_TABLE} AS t1 "\
     f"LEFT OUTER JOIN {FUTURE_TABLE} AS t2 ON t1.index_id=t2.underlier_id ORDER BY t2.lot_size DESC"
-    select_res = sql.fetch(select_query, META_DB)
+    select_res = sql_fetch(select_query, META_DB)
     instruments = []
     for row in select_res:
         index = EquityIndex(data_id=row[0], derivatives_id=row[2], name=row[1])
-        if load_data:
-            index._data_series = get_history(index.data_id)
         instruments.append(index)
+    if load_data:
+        load_histories(instruments, from_date=from_date, to_date=to_date)
     return instruments
 
-def get_stock_derivatives(load_data: bool = False) -> list[Stock]:
+def get_stock_derivatives(load_data: bool = False, from_date: dtm.date = None, to_date: dtm.date = None) -> list[Stock]:
     select_query = f"SELECT t1.ric, t1.name, t2.future_id FROM {EQUITY_TABLE} AS t1 "\
     f"LEFT OUTER JOIN {FUTURE_TABLE} AS t2 ON t1.stock_id=t2.underlier_id ORDER BY t2.lot_size DESC"
-    select_res = sql.fetch(select_query, META_DB)
+    select_res = sql_fetch(select_query, META_DB)
     instruments = []
     for row in select_res:
         stock = Stock(data_id=row[0], derivatives_id=row[2], name=row[1])
-        if load_data:
-            stock._data_series = get_history(stock.data_id)
         instruments.append(stock)
+    if load_data:
+        load_histories(instruments, from_date=from_date, to_date=to_date)
     return instruments
 
 def get_underlier(id: str):
     underlier_query = f"SELECT underlier_id FROM {FUTURE_TABLE} WHERE future_id='{id}'"
-    underlier_id, = sql.fetch(underlier_query, META_DB, count=1)
+    underlier_id, = sql_fetch(underlier_query, META_DB, count=1)
     index_query = f"SELECT ric, name FROM {INDEX_TABLE} WHERE index_id='{underlier_id}'"
-    index_res = sql.fetch(index_query, META_DB, count=1)
+    index_res = sql_fetch(index_query, META_DB, count=1)
     return EquityIndex(data_id=index_res[0], derivatives_id=underlier_id, name=index_res[1])
 
 def get_futures_contracts(series: str, session_type: SessionType, load_data: bool = False) -> list[EquityIndexFuture]:
     underlier = get_underlier(series)
     contracts_query = "SELECT contract_id, contract_month, last_trade_date, extended_session_id "\
     f"FROM {FUT_CONTRACT_TABLE} WHERE series_id='{series}'"
-    select_res = sql.fetch(contracts_query, META_DB)
+    select_res = sql_fetch(contracts_query, META_DB)
     instruments = []
     for row in select_res:
-        expiry = dtm.datetime.strptime(row[2], sql.DATE_FORMAT).date()
-        match hkex_server.get_session_default(session_type):
-            case SessionType.REGULAR:
-                data_id = row[0]
-            case SessionType.EXTENDED:
-                data_id = row[3]
-        future = EquityIndexFuture(underlier, expiry, data_id=data_id, name=f'{series} {row[1]}')
+        future = get_future_contract(underlier, series, row, session_type)
         if load_data:
             future._data_series = get_history(row[0])
         instruments.append(future)
     return instruments
 
-def get_history(ric: str):
-    select_query = f"SELECT date, close FROM {HISTORY_TABLE} WHERE instrument_id='{ric}' ORDER BY date"
-    select_res = sql.fetch(select_query, PRICES_DB)
+def get_future_contract(underlier: EquityIndex, series: str, row: tuple, session_type: SessionType) -> EquityIndexFuture:
+    expiry = dtm.datetime.strptime(row[2], sql.DATE_FORMAT).date()
+    match hkex_server.get_session_default(session_type):
+        case SessionType.REGULAR:
+            data_id = row[0]
+        case SessionType.EXTENDED:
+            data_id = row[3]
+    return EquityIndexFuture(underlier, expiry, data_id=data_id, name=f'{series} {row[1]}')
+
+def get_index_futures_contracts(indices: list[EquityIndex]) -> dict[str, dict[SessionType, list[EquityIndexFuture]]]:
+    "Contracts for all sessions of every index futures series from a single query"
+    underliers = {idx.derivatives_id: idx for idx in indices if idx.derivatives_id}
+    series_str = ', '.join(f"'{series}'" for series in underliers)
+    contracts_query = "SELECT series_id, contract_id, contract_month, last_trade_date, extended_session_id "\
+    f"FROM {FUT_CONTRACT_TABLE} WHERE series_id IN ({series_str})"
+    select_res = sql_fetch(contracts_query, META_DB)
+    contracts = {series: {st: [] for st in SessionType} for series in underliers}
+    for row in select_res:
+        for session_type in SessionType:
+            contracts[row[0]][session_type].append(get_future_contract(underliers[row[0]], row[0], row[1:], session_type))
+    return contracts
+
+def get_date_filter(from_date: dtm.date = None, to_date: dtm.date = None) -> str:
+    date_filter = ''
+    if from_date:
+        date_filter += f" AND date>='{from_date.strftime(sql.DATE_FORMAT)}'"
+    if to_date:
+        date_filter += f" AND date<='{to_date.strftime(sql.DATE_FORMAT)}'"
+    return date_filter
+
+def get_history(ric: str, from_date: dtm.date = None, to_date: dtm.date = None):
+    select_query = f"SELECT date, close FROM {HISTORY_TABLE} WHERE instrument_id='{ric}'"\
+    f"{get_date_filter(from_date, to_date)} ORDER BY date"
+    select_res = sql_fetch(select_query, PRICES_DB)
     date_series = [(dtm.datetime.strptime(row[0], sql.DATE_FORMAT).date(), row[1]) for row in select_res]
     return DataSeries(date_series)
 
+def get_history_panel(rics: list[str], from_date: dtm.date = None, to_date: dtm.date = None) -> 'pd.DataFrame':
+    import pandas as pd
+    rics_str = ', '.join(f"'{ric}'" for ric in set(rics))
+    select_query = f"SELECT date, instrument_id, close FROM {HISTORY_TABLE} WHERE instrument_id IN ({rics_str})"\
+    f"{get_date_filter(from_date, to_date)}"
+    select_res = sql_fetch(select_query, PRICES_DB)
+    history_df = pd.DataFrame(select_res, columns=['date', 'instrument_id', 'close'])
+    history_df['date'] = pd.to_datetime(history_df['date'], format=sql.DATE_FORMAT)
+    panel = history_df.pivot(index='date', columns='instrument_id', values='close').sort_index()
+    return panel.reindex(columns=list(dict.fromkeys(rics))).astype(float)
+
+def get_panel_series(panel: 'pd.DataFrame', ric: str) -> DataSeries:
+    prices = panel[ric].dropna()
+    return DataSeries(list(zip(prices.index.date, prices.to_numpy().tolist())))
+
+def load_histories(instruments: list[BaseInstrument],
+                   from_date: dtm.date = None, to_date: dtm.date = None) -> 'pd.DataFrame':
+    panel = get_history_panel([inst.data_id for inst in instruments], from_date=from_date, to_date=to_date)
+    for inst in instruments:
+        inst._data_series = get_panel_series(panel, inst.data_id)
+    return panel
+
 def get_last_date(ric: str):
     select_query = f"SELECT date FROM {HISTORY_TABLE} WHERE instrument_id='{ric}' ORDER BY date DESC"
-    last_date, = sql.fetch(select_query, PRICES_DB, count=1)
+    last_date, = sql_fetch(select_query, PRICES_DB, count=1)
     return dtm.datetime.strptime(last_date, sql.DATE_FORMAT).date()
 
-def get_intraday_data(ric: str, **kwargs) -> dict[dtm.datetime, float]:
-    chart_data = hkex_server.get_chart_data(ric, **kwargs)
-    return {row[0]: row[4] for row in chart_data}
+def get_last_dates() -> dict[str, dtm.date]:
+    select_query = f"SELECT instrument_id, MAX(date) FROM {HISTORY_TABLE} GROUP BY instrument_id"
+    select_res = sql_fetch(select_query, PRICES_DB)
+    return {row[0]: dtm.datetime.strptime(row[1], sql.DATE_FORMAT).date() for row in select_res}
+
+def get_last_closes(rics: list[str], to_date: dtm.date) -> dict[str, float]:
+    "Latest close on or before to_date, for instruments without a price in a loaded window"
+    rics_str = ', '.join(f"'{ric}'" for ric in set(rics))
+    # SQLite returns the close of the row holding MAX(date)
+    select_query = f"SELECT instrument_id, close, MAX(date) FROM {HISTORY_TABLE} WHERE instrument_id IN ({rics_str})"\
+    f" AND date<='{to_date.strftime(sql.DATE_FORMAT)}' GROUP BY instrument_id"
+    select_res = sql_fetch(select_query, PRICES_DB)
+    return {row[0]: row[1] for row in select_res}
+
+def update_histories(rics: list[str], lookback: str = '1m', max_workers: int = 8, rate_limit: float = 10,
+                     retries: int = 3, backoff: float = 1, batch_size: int = 50) -> int:
+    last_dates = get_last_dates()
+    limiter = RateLimiter(rate_limit)
+    def fetch_history(ric: str):
+        limiter.wait()
+        return hkex_server.get_chart_data(ric, frequency='1d', lookback=lookback)
+    insert_rows, num_batched, num_updated = [], 0, 0
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        history_futures = {
+            executor.submit(call_with_retry, fetch_history, ric, retries=retries, backoff=backoff): ric
+            for ric in rics
+        }
+        # results are written from this thread only as SQLite allows a single writer
+        for future in as_completed(history_futures):
+            ric = history_futures[future]
+            try:
+                history = future.result()
+            except Exception as ex:
+                logger.error(f'Failed to update history for {ric}: {ex}')
+                continue
+            first_date = last_dates[ric] + dtm.timedelta(days=1) if ric in last_dates else None
+            insert_rows.extend(hkex_server.get_history_rows(ric, history, first_date))
+            num_batched += 1
+            if num_batched >= batch_size:
+                hkex_server.insert_history_rows(insert_rows)
+                num_updated += num_batched
+                insert_rows, num_batched = [], 0
+    hkex_server.insert_history_rows(insert_rows)
+    return num_updated + num_batched
+
+def get_futures_quotes(code: str, session_type: SessionType = None) -> tuple[dtm.datetime, dict[str, float]]:
+    session_type = hkex_server.get_session_default(session_type)
+    snapshot = tick_store.get_latest_snapshot(tick_store.QUOTES_KIND, tick_store.get_quotes_key(code, session_type),
+                                              max_age=SNAPSHOT_MAX_AGE)
+    if snapshot:
+        return hkex_server.parse_futures_quotes(snapshot[1], code)
+    return hkex_server.load_futures_quotes(code, session_type=session_type)
+
+def get_options_chain_arrays(code: str, contract_id: str, session_type: SessionType = None) -> hkex_server.OptionChainArrays:
+    session_type = hkex_server.get_session_default(session_type)
+    snapshot = tick_store.get_latest_snapshot(tick_store.CHAINS_KIND, tick_store.get_chain_key(code, contract_id, session_type),
+                                              max_age=SNAPSHOT_MAX_AGE)
+    if snapshot:
+        return hkex_server.parse_options_chain_arrays(snapshot[1]['optionlist'])
+    return hkex_server.get_options_chain_arrays(code, contract_id, session_type=session_type)
+
+# bars are partitioned by session date, overnight bars of the extended session belong to the previous day
+INTRADAY_LOOKBACKS = {1: '1d', 5: '5d'}
+def get_session_date(bar_time: dtm.datetime) -> dtm.date:
+    if bar_time.time() <= hkex_server.EXTENDED_CLOSE_TIME:
+        return bar_time.date() - dtm.timedelta(days=1)
+    return bar_time.date()
+
+INTRADAY_TABLE_CREATED = False
+def create_intraday_table():
+    global INTRADAY_TABLE_CREATED
+    if INTRADAY_TABLE_CREATED:
+        return
+    create_query = f"CREATE TABLE IF NOT EXISTS {INTRADAY_TABLE} ("\
+    "instrument_id TEXT, date TEXT, time TEXT, open REAL, high REAL, low REAL, close REAL, volume INTEGER, turnover REAL, "\
+    f"CONSTRAINT {INTRADAY_TABLE}_pk PRIMARY KEY (instrument_id, date, time));"
+    sql_modify(create_query, INTRADAY_DB)
+    INTRADAY_TABLE_CREATED = True
+
+def get_last_intraday_time(ric: str) -> dtm.datetime:
+    create_intraday_table()
+    select_query = f"SELECT MAX(time) FROM {INTRADAY_TABLE} WHERE instrument_id='{ric}'"
+    last_time, = sql_fetch(select_query, INTRADAY_DB, count=1)
+    return dtm.datetime.strptime(last_time, INTRADAY_TIME_FORMAT) if last_time else None
+
+def get_intraday_lookback(last_time: dtm.datetime) -> str:
+    if last_time:
+        gap_days = (dtm.datetime.now() - last_time).days + 1
+        for days, lookback in INTRADAY_LOOKBACKS.items():
+            if gap_days <= days:
+                return lookback
+    return max(INTRADAY_LOOKBACKS.items())[1]
+
+def sql_value(value: any) -> str:
+    return 'NULL' if value is None else str(value)
+
+def update_intraday_bars(ric: str, chart_data: list[list] = None) -> int:
+    "Stores 1min bars from the last stored one on, from chart_data if given or a live request"
+    last_time = get_last_intraday_time(ric)
+    if chart_data is None:
+        chart_data = hkex_server.request_chart_data(ric, frequency='1min', lookback=get_intraday_lookback(last_time))
+    insert_rows = []
+    for row in hkex_server.parse_chart_data(chart_data):
+        # the last stored bar may have been the forming minute, so it is rewritten
+        if last_time and row[0] < last_time:
+            continue
+        insert_rows.append(f"\n('{ric}', '{get_session_date(row[0]).strftime(sql.DATE_FORMAT)}', "\
+            f"'{row[0].strftime(INTRADAY_TIME_FORMAT)}', {', '.join(sql_value(v) for v in row[1:7])})")
+    if insert_rows:
+        insert_query = f"INSERT OR REPLACE INTO {INTRADAY_TABLE} VALUES {','.join(insert_rows)};"
+        sql_modify(insert_query, INTRADAY_DB)
+    return len(insert_rows)
+
+def get_intraday_history(ric: str, from_date: dtm.date = None, to_date: dtm.date = None) -> dict[dtm.datetime, float]:
+    create_intraday_table()
+    select_query = f"SELECT time, close FROM {INTRADAY_TABLE} WHERE instrument_id='{ric}'"\
+    f"{get_date_filter(from_date, to_date)} ORDER BY time"
+    select_res = sql_fetch(select_query, INTRADAY_DB)
+    return {dtm.datetime.strptime(row[0], INTRADAY_TIME_FORMAT): row[1] for row in select_res}
+
+def get_intraday_data(ric: str, frequency: str = '1min', lookback: str = '1d') -> dict[dtm.datetime, float]:
+    if (frequency, lookback) != ('1min', '1d'):
+        chart_data = hkex_server.get_chart_data(ric, frequency=frequency, lookback=lookback)
+        return {row[0]: row[4] for row in chart_data}
+    # bars are already stored by the scheduler when its snapshot is fresh
+    if not tick_store.get_latest_snapshot(tick_store.CHARTS_KIND, ric, max_age=SNAPSHOT_MAX_AGE):
+        update_intraday_bars(ric)
+    last_time = get_last_intraday_time(ric)
+    if not last_time:
+        return {}
+    session_date = get_session_date(last_time)
+    return get_intraday_history(ric, from_date=session_date, to_date=session_date)
 
 if __name__ == '__main__':
     hkex_server.set_token()
@@ -110,7 +308,4 @@ if __name__ == '__main__':
     #     stocks.update(get_components(c))
     # for s in stocks:
     #     hkex_server.load_stock_details(s)
-    for s in get_stocks() + get_indices():
-        from_date = get_last_date(s.data_id) + dtm.timedelta(days=1)
-        hkex_server.update_history_daily(s.data_id, '1m', from_date)
-    pass
+    update_histories([s.data_id for s in get_stocks() + get_indices()], '1m')
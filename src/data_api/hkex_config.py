@@ -6,3 +6,9 @@ FUTURE_TABLE = 'futures'
 HISTORY_TABLE = 'history'
 
 FUT_CONTRACT_TABLE = 'equity_futures_contracts'
+
+INTRADAY_TABLE = 'intraday_history'
+INTRADAY_TIME_FORMAT = '%Y-%m-%d %H:%M:%S'
+
+# seconds a scheduler snapshot is served before falling back to a live request
+SNAPSHOT_MAX_AGE = 300
@@ -0,0 +1,99 @@
+from dataclasses import dataclass, field
+from concurrent.futures import ThreadPoolExecutor
+import datetime as dtm
+import threading
+import time
+import logging
+
+from common.models.market_data import SessionType
+from data_api import hkex_client, hkex_server, tick_store
+
+logger = logging.Logger(__name__)
+
+# polling interval in seconds per snapshot kind and trading session, None when the market is closed
+SNAPSHOT_INTERVALS = {
+    tick_store.QUOTES_KIND: {SessionType.REGULAR: 15, SessionType.EXTENDED: 30, None: 900},
+    tick_store.CHAINS_KIND: {SessionType.REGULAR: 60, SessionType.EXTENDED: 120, None: 3600},
+    tick_store.CHARTS_KIND: {SessionType.REGULAR: 60, SessionType.EXTENDED: 120, None: 3600},
+}
+NUM_CHART_FUTURES = 2
+
+@dataclass
+class SnapshotScheduler:
+    "Background poller of futures quotes, option chains and intraday charts into the tick store"
+    codes: list[str] # futures series ids
+    index_rics: list[str] = field(default_factory=list)
+    max_workers: int = 4
+    _next_times: dict[str, float] = field(init=False, default_factory=dict)
+    _stop_event: threading.Event = field(init=False, default_factory=threading.Event)
+    _thread: threading.Thread = field(init=False, default=None)
+
+    @classmethod
+    def from_index_derivatives(cls, **kwargs):
+        indices = [idx for idx in hkex_client.get_index_derivatives() if idx.derivatives_id]
+        return cls([idx.derivatives_id for idx in indices], [idx.data_id for idx in indices], **kwargs)
+
+    def get_live_contracts(self, code: str, session_type: SessionType):
+        today = dtm.date.today()
+        futures_list = hkex_client.get_futures_contracts(code, session_type=session_type)
+        return sorted([fut for fut in futures_list if fut.expiry >= today], key=lambda fut: fut.expiry)
+
+    def snapshot_quotes(self, session_type: SessionType):
+        for code in self.codes:
+            data = hkex_server.request_futures_details(code, session_type)
+            tick_store.append_snapshot(tick_store.QUOTES_KIND, tick_store.get_quotes_key(code, session_type), data)
+
+    def snapshot_chains(self, session_type: SessionType):
+        chain_keys = [(code, future.expiry.strftime('%m%Y'))
+                      for code in self.codes for future in self.get_live_contracts(code, session_type)]
+        for code, contract_id in chain_keys:
+            data = hkex_server.request_options_chain(code, contract_id, session_type=session_type)
+            tick_store.append_snapshot(tick_store.CHAINS_KIND, tick_store.get_chain_key(code, contract_id, session_type), data)
+
+    def snapshot_charts(self, session_type: SessionType):
+        rics = list(self.index_rics)
+        for code in self.codes:
+            rics.extend(fut.data_id for fut in self.get_live_contracts(code, session_type)[:NUM_CHART_FUTURES])
+        for ric in rics:
+            chart_data = hkex_server.request_chart_data(ric)
+            hkex_client.update_intraday_bars(ric, chart_data)
+            tick_store.append_snapshot(tick_store.CHARTS_KIND, ric, chart_data)
+
+    def run_once(self, current_dtm: dtm.datetime = None) -> float:
+        "Runs the due snapshot kinds and returns seconds until the next one is due"
+        trading_session = hkex_server.get_trading_session(current_dtm)
+        session_type = trading_session or hkex_server.get_session_default()
+        snapshot_funcs = {
+            tick_store.QUOTES_KIND: self.snapshot_quotes,
+            tick_store.CHAINS_KIND: self.snapshot_chains,
+            tick_store.CHARTS_KIND: self.snapshot_charts,
+        }
+        current_time = time.monotonic()
+        due_kinds = [kind for kind in snapshot_funcs if self._next_times.get(kind, 0) <= current_time]
+        if due_kinds:
+            with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+                kind_futures = {kind: executor.submit(snapshot_funcs[kind], session_type) for kind in due_kinds}
+            for kind, future in kind_futures.items():
+                if future.exception():
+                    logger.error(f'Failed {kind} snapshot: {future.exception()}')
+                self._next_times[kind] = current_time + SNAPSHOT_INTERVALS[kind][trading_session]
+        return max(0, min(self._next_times.values()) - time.monotonic())
+
+    def run(self):
+        while not self._stop_event.is_set():
+            self._stop_event.wait(self.run_once())
+
+    def start(self):
+        self._stop_event.clear()
+        self._thread = threading.Thread(target=self.run, name='snapshot-scheduler', daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self, timeout: float = None):
+        self._stop_event.set()
+        if self._thread:
+            self._thread.join(timeout)
+
+
+if __name__ == '__main__':
+    SnapshotScheduler.from_index_derivatives().run()
@@ -1,17 +1,31 @@
 import datetime as dtm
-from bs4 import BeautifulSoup
-import regex
+from dataclasses import dataclass, field
+from typing import Callable
+import functools
 import urllib
+import threading
+import requests
+from requests.adapters import HTTPAdapter
+import json
 import logging
+import numpy as np
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
 
 from common import request_web, sql
 from common.models.market_data import InstrumentDataField, MarketDataType, InstrumentDataModel, SessionType, OptionDataFlag
 from data_api.db_config import META_DB, PRICES_DB
 from data_api.hkex_config import *
+from data_api.replay_server import get_site_url
+from lib.cache import TTLCache
+from lib import timing
 
 logger = logging.Logger(__name__)
 
-COMPONENTS_URL = "https://www.hsi.com.hk/data/eng/rt/index-series/{code}/constituents.do"
+COMPONENTS_URL = get_site_url("https://www.hsi.com.hk/data/eng/rt/index-series/{code}/constituents.do")
 def update_components(series: str):
     from_date = dtm.date(2024, 6, 11)
     series_json = request_web.get_json(request_web.url_get(COMPONENTS_URL.format(code=series.lower())))
@@ -31,11 +45,13 @@ def update_components(series: str):
         return sql.modify(insert_query, META_DB)
     return False
 
-CALENDAR_URL = "https://www.hkex.com.hk/Services/Trading/Derivatives/Overview/Trading-Calendar-and-Holiday-Schedule?sc_lang=en"
+CALENDAR_URL = get_site_url("https://www.hkex.com.hk/Services/Trading/Derivatives/Overview/Trading-Calendar-and-Holiday-Schedule?sc_lang=en")
 # CALENDAR_COLS = ['Contract', 'Expiry', 'Settle']
 def cell_to_date(cell: str):
     return dtm.datetime.strptime(cell, '%d-%b-%y').date()
 def get_expiry_dates() -> dict[str, tuple[dtm.date, dtm.date]]:
+    # HTML parsers are only needed by the calendar and token pages, so they load on first use
+    from bs4 import BeautifulSoup
     calendar_text = request_web.url_get(CALENDAR_URL)
     calendar_soup = BeautifulSoup(calendar_text, 'html.parser')
     for s_table in calendar_soup.find_all('table'):
@@ -57,77 +73,186 @@ def str_to_num(input: str, num_type = float) -> float:
     else:
         return 0
 
+def str_to_num_or_none(input: str, num_type = float) -> float:
+    return str_to_num(input, num_type) if input else None
+
+def str_to_int(input: str) -> int:
+    return str_to_num(input, int)
+
+def str_to_int_or_none(input: str) -> int:
+    return str_to_num(input, int) if input else None
+
+# response key and converter (None to keep the raw value) for each field
+FIELD_EXTRACTORS = {
+    InstrumentDataField.NAME: ('nm', None),
+    InstrumentDataField.RIC: ('ric', None),
+    InstrumentDataField.CONTRACT: ('con', None),
+    InstrumentDataField.CCY: ('ccy', None),
+    MarketDataType.LAST: ('ls', str_to_num_or_none),
+    MarketDataType.BID: ('bd', str_to_num_or_none),
+    MarketDataType.ASK: ('as', str_to_num_or_none),
+    MarketDataType.PREV_CLOSE: ('hc', str_to_num),
+    MarketDataType.SETTLE: ('se', str_to_num_or_none),
+    MarketDataType.OPEN: ('op', str_to_num_or_none),
+    MarketDataType.VOLUME: ('vo', str_to_int_or_none),
+    MarketDataType.PREV_OI: ('oi', str_to_int_or_none),
+    InstrumentDataField.LOT_SIZE: ('lot', str_to_int),
+    InstrumentDataField.TICK_SIZE: ('tck', float),
+    MarketDataType.UPDATE_TIME: ('updatetime', None),
+}
+
+@functools.lru_cache(maxsize=64)
+def compile_fields(datapoint_types: tuple[MarketDataType]) -> tuple[tuple[MarketDataType, str, Callable], ...]:
+    extractors = []
+    for dtp in datapoint_types:
+        if dtp not in FIELD_EXTRACTORS:
+            logger.error(f'Unhandled {dtp}')
+            extractors.append((dtp, None, None))
+        else:
+            extractors.append((dtp, *FIELD_EXTRACTORS[dtp]))
+    return tuple(extractors)
+
 def get_field(data_dict: dict[str, any], datapoint_type: MarketDataType):
-    match datapoint_type:
-        case InstrumentDataField.NAME:
-            return data_dict['nm']
-        case InstrumentDataField.RIC:
-            return data_dict['ric']
-        case InstrumentDataField.CONTRACT:
-            return data_dict['con']
-        case InstrumentDataField.CCY:
-            return data_dict['ccy']
-        case MarketDataType.LAST:
-            return str_to_num(data_dict['ls']) if data_dict['ls'] else None
-        case MarketDataType.BID:
-            return str_to_num(data_dict['bd']) if data_dict['bd'] else None
-        case MarketDataType.ASK:
-            return str_to_num(data_dict['as']) if data_dict['as'] else None
-        case MarketDataType.PREV_CLOSE:
-            return str_to_num(data_dict['hc'])
-        case MarketDataType.SETTLE:
-            return str_to_num(data_dict['se']) if data_dict['se'] else None
-        case MarketDataType.OPEN:
-            return str_to_num(data_dict['op']) if data_dict['op'] else None
-        case MarketDataType.VOLUME:
-            return str_to_num(data_dict['vo'], int) if data_dict['vo'] else None
-        case MarketDataType.PREV_OI:
-            return str_to_num(data_dict['oi'], int) if data_dict['oi'] else None
-        case InstrumentDataField.LOT_SIZE:
-            return str_to_num(data_dict['lot'], int)
-        case InstrumentDataField.TICK_SIZE:
-            return float(data_dict['tck'])
-        case MarketDataType.UPDATE_TIME:
-            return data_dict['updatetime']
-        case _:
-            logger.error(f'Unhandled {datapoint_type}')
+    (_, key, converter), = compile_fields((datapoint_type,))
+    if key is None:
+        return None
+    return converter(data_dict[key]) if converter else data_dict[key]
 
 def get_fields(data_dict: dict[str, any], datapoint_types: list[MarketDataType]):
     res = InstrumentDataModel()
-    for dtp in datapoint_types:
-        res[dtp] = get_field(data_dict, dtp)
+    for dtp, key, converter in compile_fields(tuple(datapoint_types)):
+        if key is None:
+            res[dtp] = None
+        else:
+            res[dtp] = converter(data_dict[key]) if converter else data_dict[key]
     return res
 
+def get_fields_list(rows: list[dict[str, any]], datapoint_types: list[MarketDataType]) -> list[InstrumentDataModel]:
+    return [get_fields(row, datapoint_types) for row in rows]
 
-SESSION_TOKEN = None
-TOKEN_HOME_URL = "https://www.hkex.com.hk/Market-Data/Securities-Prices/Equities/Equities-Quote?sc_lang=en"
-def set_token():
-    token_home_text = request_web.url_get(TOKEN_HOME_URL)
+TOKEN_HOME_URL = get_site_url("https://www.hkex.com.hk/Market-Data/Securities-Prices/Equities/Equities-Quote?sc_lang=en")
+def parse_token(token_home_text: str) -> str:
+    from bs4 import BeautifulSoup
+    import regex
     token_home_soup = BeautifulSoup(token_home_text, 'html.parser')
     token_func = token_home_soup.find(string=regex.compile('getToken'))
     token_return = regex.search("return \"Base64-AES-Encrypted-Token\";[\r\n]+\s*return \"([^\";\r\n]+)", token_func)
-    global SESSION_TOKEN
-    SESSION_TOKEN = token_return.group(1)
-    logger.info(SESSION_TOKEN)
+    return token_return.group(1)
+
+
+DATA_URL = get_site_url("https://www1.hkex.com.hk/hkexwidget/data/")
+JSONP_CALLBACK = 'jQuery0_0'
+SUCCESS_CODE = '000'
+# responsecode of a request made with an expired or invalid token
+INVALID_TOKEN_CODE = '005'
+REQUEST_HEADERS = {
+    'User-Agent': 'Mozilla/5.0',
+    'Referer': 'https://www.hkex.com.hk/',
+}
+def decode_jsonp(payload: bytes, callback: str = JSONP_CALLBACK, use_orjson: bool = True) -> any:
+    # strip the callback wrapper by offsets instead of a regex over the whole payload
+    prefix = callback.encode() + b'('
+    start, end = payload.find(prefix), payload.rfind(b')')
+    if start < 0 or end < start:
+        return None
+    start += len(prefix)
+    if orjson and use_orjson:
+        return orjson.loads(memoryview(payload)[start:end])
+    return json.loads(payload[start:end])
+
+@dataclass
+class WidgetSession:
+    "Thread-safe keep-alive session for the HKEX widget API with token refresh"
+    pool_size: int = 16
+    timeout: float = 10
+    _token: str = field(init=False, default=None)
+    _token_lock: threading.Lock = field(init=False, default_factory=threading.Lock)
+
+    def __post_init__(self):
+        self._session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=self.pool_size, pool_maxsize=self.pool_size)
+        self._session.mount('https://', adapter)
+        self._session.mount('http://', adapter)
+        self._session.headers.update(REQUEST_HEADERS)
+
+    @property
+    def token(self) -> str:
+        return self._token
+
+    def url_get(self, url: str, params: str = None) -> str:
+        response = self._session.get(url, params=params, timeout=self.timeout)
+        response.raise_for_status()
+        return response.text
+
+    def url_get_content(self, url: str, params: str = None) -> bytes:
+        response = self._session.get(url, params=params, timeout=self.timeout)
+        response.raise_for_status()
+        return response.content
+
+    def refresh_token(self, expired_token: str = None) -> str:
+        with self._token_lock:
+            # skip if another thread already replaced the expired token while this one waited
+            if self._token is None or self._token == expired_token:
+                self._token = parse_token(self.url_get(TOKEN_HOME_URL))
+                logger.info(self._token)
+            return self._token
+
+    def request_data(self, endpoint: str, params: dict[str, any], token: str) -> dict[str, any]:
+        request_params = dict(params) | {
+            'token': token,
+            'lang': 'eng',
+            'qid': 0,
+            'callback': JSONP_CALLBACK,
+        }
+        params_str = urllib.parse.urlencode(request_params, safe='%')
+        with timing.timed(f'hkex.http.{endpoint}'):
+            payload = self.url_get_content(DATA_URL + endpoint, params=params_str)
+        with timing.timed(f'hkex.jsonp.{endpoint}'):
+            response_json = decode_jsonp(payload)
+        if not response_json:
+            return None
+        return response_json.get('data')
+
+    def get_json_data(self, endpoint: str, params: dict[str, any] = None) -> dict[str, any]:
+        token = self._token or self.refresh_token()
+        data = self.request_data(endpoint, params or {}, token)
+        if is_invalid_token(data):
+            logger.warning(f'Invalid token for {endpoint}, refreshing token')
+            data = self.request_data(endpoint, params or {}, self.refresh_token(expired_token=token))
+            if is_invalid_token(data):
+                raise RuntimeError(f'Invalid token for {endpoint} after token refresh')
+        return data
+
+def is_invalid_token(data: dict[str, any]) -> bool:
+    return bool(data) and data.get('responsecode') == INVALID_TOKEN_CODE
+
+def is_success(data: dict[str, any]) -> bool:
+    return bool(data) and data.get('responsecode', SUCCESS_CODE) == SUCCESS_CODE
+
+WIDGET_SESSION = WidgetSession()
+
+def set_token():
+    WIDGET_SESSION.refresh_token(expired_token=WIDGET_SESSION.token)
 
 def is_valid_token():
-    return SESSION_TOKEN is not None
-
-
-DATA_URL = "https://www1.hkex.com.hk/hkexwidget/data/"
-def request_get_json_data(endpoint: str, params: dict[str, any] = {}):
-    if not is_valid_token():
-        set_token()
-    params.update({
-        'token': SESSION_TOKEN,
-        'lang': 'eng',
-        'qid': 0,
-        'callback': 'jQuery0_0',
-    })
-    params_str = urllib.parse.urlencode(params, safe='%') if params else None
-    response_text = request_web.url_get(DATA_URL + endpoint, params=params_str)
-    text_json = regex.search("jQuery0_0\((.*)\)", response_text).group(1)
-    return request_web.get_json(text_json)['data']
+    return WIDGET_SESSION.token is not None
+
+# responses are cached per endpoint and parameters, tokens are added by the session
+RESPONSE_CACHE = TTLCache(max_size=512)
+def request_get_json_data(endpoint: str, params: dict[str, any] = None):
+    params = params or {}
+    ttl = get_cache_ttl(endpoint, params)
+    with timing.timed(f'hkex.request.{endpoint}'):
+        if not ttl:
+            return WIDGET_SESSION.get_json_data(endpoint, params)
+        cache_key = (endpoint, tuple(sorted(params.items())))
+        data = RESPONSE_CACHE.get(cache_key)
+        if data is None:
+            data = WIDGET_SESSION.get_json_data(endpoint, params)
+            # error responses are passed back without being cached
+            if is_success(data):
+                RESPONSE_CACHE.set(cache_key, data, ttl=ttl)
+        return data
 
 STOCK_EP = "getequityquote"
 #?sym={code}&token={token}&lang=eng&qid=0&callback=jQuery0_0"
@@ -168,7 +293,7 @@ def update_index_details(code: str):
     return sql.modify(insert_query, META_DB)
 
 STOCK_DERIVS_EP = "getstockderivativeslist"
-STOCK_DERIVS_URL = 'https://www.hkex.com.hk/Products/Listed-Derivatives/Single-Stock/Stock-Futures?sc_lang=en'
+STOCK_DERIVS_URL = get_site_url('https://www.hkex.com.hk/Products/Listed-Derivatives/Single-Stock/Stock-Futures?sc_lang=en')
 def update_stock_derivatives():
     stock_list = request_get_json_data(STOCK_DERIVS_EP)['stocklist']
     lot_sizes = {
@@ -190,7 +315,7 @@ def update_stock_derivatives():
 REGULAR_OPEN_TIME = dtm.time(9, 30)
 REGULAR_CLOSE_TIME = dtm.time(16, 30)
 EXTENDED_OPEN_TIME = dtm.time(17, 30)
-# EXTENDED_CLOSE_TIME = dtm.time(3, 0)
+EXTENDED_CLOSE_TIME = dtm.time(3, 0)
 def get_session_default(session_type: SessionType = None) -> SessionType:
     if session_type in list(SessionType):
         return session_type
@@ -204,6 +329,19 @@ def get_session_default(session_type: SessionType = None) -> SessionType:
         return SessionType.EXTENDED
     return SessionType.REGULAR
 
+def get_trading_session(current_dtm: dtm.datetime = None) -> SessionType:
+    "Session trading at the given time, None outside of trading hours"
+    current_dtm = current_dtm or dtm.datetime.now()
+    current_date, current_time = current_dtm.date(), current_dtm.time()
+    if REGULAR_OPEN_TIME <= current_time <= REGULAR_CLOSE_TIME:
+        return SessionType.REGULAR if current_date.weekday() < 5 else None
+    elif current_time >= EXTENDED_OPEN_TIME:
+        return SessionType.EXTENDED if current_date.weekday() < 5 else None
+    elif current_time <= EXTENDED_CLOSE_TIME:
+        # overnight part of the previous weekday's extended session
+        return SessionType.EXTENDED if 0 < current_date.weekday() < 6 else None
+    return None
+
 # DERIVS_EP = "getderivativesinfo"
 # def getDerivativesInfo(code) -> dict[str, any]:
 #     deriv_data = request_get_json_data(DERIVS_EP, params={'ats': code})['info']
@@ -222,7 +360,9 @@ def request_futures_details(series: str, session_type: SessionType):
     return request_get_json_data(FUTURES_EP, params=url_params)
 
 def load_futures_quotes(code: str, session_type: SessionType = None) -> tuple[dtm.datetime, dict[str, float]]:
-    futs_data = request_futures_details(code, session_type)
+    return parse_futures_quotes(request_futures_details(code, session_type), code)
+
+def parse_futures_quotes(futs_data: dict[str, any], code: str) -> tuple[dtm.datetime, dict[str, float]]:
     last_update = dtm.datetime.strptime(futs_data['lastupd'], "%d/%m/%Y %H:%M")
     res = {}
     fields = [InstrumentDataField.CONTRACT, InstrumentDataField.RIC]
@@ -273,7 +413,7 @@ def is_valid_live(data_fields: dict[str, any]) -> bool:
     return False
 
 OPTION_CHAIN_EP = "getderivativesoption"
-def get_options_chain(code: str, contract_id: str, session_type: SessionType = None) -> dict[float, dict[str, InstrumentDataModel]]:
+def request_options_chain(code: str, contract_id: str, session_type: SessionType = None) -> dict[str, any]:
     url_params = {
         'ats': code,
         'con': contract_id,
@@ -281,7 +421,10 @@ def get_options_chain(code: str, contract_id: str, session_type: SessionType = N
         'fr': 'null',
         'to': 'null',
     }
-    options_data = request_get_json_data(OPTION_CHAIN_EP, params=url_params)
+    return request_get_json_data(OPTION_CHAIN_EP, params=url_params)
+
+def get_options_chain(code: str, contract_id: str, session_type: SessionType = None) -> dict[float, dict[str, InstrumentDataModel]]:
+    options_data = request_options_chain(code, contract_id, session_type=session_type)
     # last_update = dtm.datetime.strptime(options_data['lastupd'], "%d/%m/%Y %H:%M")
     fields = [MarketDataType.LAST, MarketDataType.BID, MarketDataType.ASK, MarketDataType.VOLUME, MarketDataType.PREV_OI]
     res = {}
@@ -296,6 +439,55 @@ def get_options_chain(code: str, contract_id: str, session_type: SessionType = N
             res[strike][OptionDataFlag.CALL] = call_fields_data
     return res
 
+@dataclass
+class OptionChainArrays:
+    "Option chain of one expiry as arrays aligned on strikes, missing values are NaN"
+    strikes: np.ndarray
+    call_last: np.ndarray
+    call_bid: np.ndarray
+    call_ask: np.ndarray
+    call_volume: np.ndarray
+    call_oi: np.ndarray
+    put_last: np.ndarray
+    put_bid: np.ndarray
+    put_ask: np.ndarray
+    put_volume: np.ndarray
+    put_oi: np.ndarray
+    call_valid: np.ndarray
+    put_valid: np.ndarray
+
+    @property
+    def size(self) -> int:
+        return len(self.strikes)
+
+# column suffix and response key extracted for each side of the chain
+CHAIN_FIELDS = (('last', 'ls'), ('bid', 'bd'), ('ask', 'as'), ('volume', 'vo'), ('oi', 'oi'))
+CHAIN_SIDES = (('call', 'c'), ('put', 'p'))
+
+def str_to_num_array(values: list[str]) -> np.ndarray:
+    return np.fromiter((float(v.replace(',', '')) if v else np.nan for v in values), dtype=np.float64, count=len(values))
+
+def is_valid_live_array(volume: np.ndarray, bid: np.ndarray, ask: np.ndarray) -> np.ndarray:
+    def is_set(values: np.ndarray):
+        return ~np.isnan(values) & (values != 0)
+    return is_set(volume) | (is_set(bid) & is_set(ask))
+
+def parse_options_chain_arrays(option_list: list[dict[str, any]]) -> OptionChainArrays:
+    columns = {f'{side}_{name}': [] for side, _ in CHAIN_SIDES for name, _ in CHAIN_FIELDS}
+    extractors = [(row_key, key, columns[f'{side}_{name}']) for side, row_key in CHAIN_SIDES for name, key in CHAIN_FIELDS]
+    strikes = []
+    for row in option_list:
+        strikes.append(row['strike'])
+        for row_key, key, column in extractors:
+            column.append(row[row_key][key] or '')
+    arrays = {k: str_to_num_array(v) for k, v in columns.items()}
+    for side, _ in CHAIN_SIDES:
+        arrays[f'{side}_valid'] = is_valid_live_array(arrays[f'{side}_volume'], arrays[f'{side}_bid'], arrays[f'{side}_ask'])
+    return OptionChainArrays(strikes=str_to_num_array(strikes), **arrays)
+
+def get_options_chain_arrays(code: str, contract_id: str, session_type: SessionType = None) -> OptionChainArrays:
+    options_data = request_options_chain(code, contract_id, session_type=session_type)
+    return parse_options_chain_arrays(options_data['optionlist'])
 
 SPAN_MAP = {
     '1min': '0',
@@ -322,18 +514,21 @@ INTERVAL_MAP = {
 # HIST_COLS = ['Open', 'High', 'Low', 'Close', 'Volume', 'Turnover']
 HISTORY_EP = "getchartdata2"
 #?span={frequency}&int={lookback}&ric={ric}&token={token}&lang=eng&qid=0&callback=jQuery0_0"
-def get_chart_data(ric: str, frequency: str='1min', lookback: str='1d'):
+def request_chart_data(ric: str, frequency: str='1min', lookback: str='1d') -> list[list]:
     url_params = {
         'span': SPAN_MAP[frequency],
         'int': INTERVAL_MAP[lookback],
         'ric': ric,
     }
-    chart_data = request_get_json_data(HISTORY_EP, params=url_params)['datalist']
-    res = [(dtm.datetime.fromtimestamp(row[0]/1000), *row[1:]) for row in chart_data[1:-1]]
-    return res
+    return request_get_json_data(HISTORY_EP, params=url_params)['datalist']
 
-def update_history_daily(ric: str, lookback: str, first_date: dtm.date = None):
-    history = get_chart_data(ric, frequency='1d', lookback=lookback)
+def parse_chart_data(chart_data: list[list]) -> list[tuple]:
+    return [(dtm.datetime.fromtimestamp(row[0]/1000), *row[1:]) for row in chart_data[1:-1]]
+
+def get_chart_data(ric: str, frequency: str='1min', lookback: str='1d'):
+    return parse_chart_data(request_chart_data(ric, frequency=frequency, lookback=lookback))
+
+def get_history_rows(ric: str, history: list[tuple], first_date: dtm.date = None) -> list[str]:
     insert_rows = []
     for row in history:
         date = row[0].strftime(sql.DATE_FORMAT)
@@ -342,11 +537,47 @@ def update_history_daily(ric: str, lookback: str, first_date: dtm.date = None):
         insert_rows.append(f"\n("\
             f"'{ric}', '{date}', '{float(row[1])}', {float(row[2])}, {float(row[3])}, {float(row[4])}, "\
             f"{int(row[5])}, {int(row[6])})")
+    return insert_rows
+
+def insert_history_rows(insert_rows: list[str]):
     if insert_rows:
         insert_query = f"INSERT OR IGNORE INTO {HISTORY_TABLE} VALUES {','.join(insert_rows)};"
         return sql.modify(insert_query, PRICES_DB)
     return False
 
+INTRADAY_SPANS = {SPAN_MAP[k] for k in ('1min', '5min', '15min', '1h')}
+CACHE_TTLS = {
+    FUTURES_EP: 5,
+    OPTION_CHAIN_EP: 5,
+}
+INTRADAY_CHART_TTL = 30
+DAILY_CHART_TTL = 24 * 60 * 60
+# time after the regular close for the closing auction to settle today's bar
+DAILY_BAR_SETTLE = dtm.timedelta(minutes=30)
+def get_daily_chart_ttl(current_dtm: dtm.datetime = None) -> float:
+    "Intraday TTL while today's bar is open, otherwise until the next regular open"
+    current_dtm = current_dtm or dtm.datetime.now()
+    current_date = current_dtm.date()
+    open_dtm = dtm.datetime.combine(current_date, REGULAR_OPEN_TIME)
+    settle_dtm = dtm.datetime.combine(current_date, REGULAR_CLOSE_TIME) + DAILY_BAR_SETTLE
+    if current_date.weekday() < 5 and open_dtm <= current_dtm < settle_dtm:
+        return INTRADAY_CHART_TTL
+    if current_date.weekday() > 4 or current_dtm >= open_dtm:
+        next_date = current_date + dtm.timedelta(days=1)
+        while next_date.weekday() > 4:
+            next_date += dtm.timedelta(days=1)
+        open_dtm = dtm.datetime.combine(next_date, REGULAR_OPEN_TIME)
+    return min((open_dtm - current_dtm).total_seconds(), DAILY_CHART_TTL)
+
+def get_cache_ttl(endpoint: str, params: dict[str, any]) -> float:
+    if endpoint == HISTORY_EP:
+        return INTRADAY_CHART_TTL if params['span'] in INTRADAY_SPANS else get_daily_chart_ttl()
+    return CACHE_TTLS.get(endpoint)
+
+def update_history_daily(ric: str, lookback: str, first_date: dtm.date = None):
+    history = get_chart_data(ric, frequency='1d', lookback=lookback)
+    return insert_history_rows(get_history_rows(ric, history, first_date))
+
 
 if __name__ == '__main__':
     # get_expiry_dates()
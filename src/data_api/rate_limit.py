@@ -0,0 +1,34 @@
+from dataclasses import dataclass, field
+import threading
+import time
+import logging
+
+logger = logging.Logger(__name__)
+
+@dataclass
+class RateLimiter:
+    "Spaces calls across threads to at most rate per second"
+    rate: float
+    _lock: threading.Lock = field(init=False, default_factory=threading.Lock)
+    _next_time: float = field(init=False, default=0)
+
+    def wait(self):
+        if not self.rate:
+            return
+        with self._lock:
+            current_time = time.monotonic()
+            wait_time = self._next_time - current_time
+            self._next_time = max(current_time, self._next_time) + 1 / self.rate
+        if wait_time > 0:
+            time.sleep(wait_time)
+
+def call_with_retry(func, *args, retries: int = 3, backoff: float = 1, **kwargs):
+    for attempt in range(retries + 1):
+        try:
+            return func(*args, **kwargs)
+        except Exception as ex:
+            if attempt == retries:
+                raise
+            delay = backoff * 2 ** attempt
+            logger.warning(f'Retrying {func.__name__} in {delay}s after {ex}')
+            time.sleep(delay)
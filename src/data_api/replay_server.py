@@ -0,0 +1,174 @@
+from dataclasses import dataclass, field
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+import argparse
+import hashlib
+import json
+import logging
+import os
+import random
+import threading
+import time
+import urllib.parse
+import requests
+
+from data_api.db_config import REPLAY_DIR
+
+logger = logging.Logger(__name__)
+
+# base URL of a replay server standing in for the HKEX, HSI and HKAB sites, e.g. http://localhost:8052
+REPLAY_URL = os.environ.get('HKEX_REPLAY_URL')
+# request parameters that change per session and do not affect the response
+VOLATILE_PARAMS = ('token', 'qid', 'callback', '_')
+RECORD_HEADERS = {
+    'User-Agent': 'Mozilla/5.0',
+    'Referer': 'https://www.hkex.com.hk/',
+}
+
+def get_site_url(url: str, replay_url: str = REPLAY_URL) -> str:
+    "url routed through the replay server as /host/path when configured"
+    if not replay_url:
+        return url
+    parsed = urllib.parse.urlsplit(url)
+    site_url = f"{replay_url.rstrip('/')}/{parsed.netloc}{parsed.path}"
+    return f'{site_url}?{parsed.query}' if parsed.query else site_url
+
+def get_fixture_key(path: str, query: str) -> str:
+    params = sorted((k, v) for k, v in urllib.parse.parse_qsl(query, keep_blank_values=True) if k not in VOLATILE_PARAMS)
+    return f'{path}?{urllib.parse.urlencode(params)}' if params else path
+
+def get_fixture_path(fixtures_dir: str, key: str) -> str:
+    host = key.strip('/').split('/', 1)[0]
+    return os.path.join(fixtures_dir, host, hashlib.sha1(key.encode()).hexdigest() + '.json')
+
+def load_fixture(fixtures_dir: str, key: str) -> dict[str, any]:
+    fixture_path = get_fixture_path(fixtures_dir, key)
+    if not os.path.exists(fixture_path):
+        return None
+    with open(fixture_path) as f:
+        return json.load(f)
+
+def save_fixture(fixtures_dir: str, key: str, fixture: dict[str, any]):
+    fixture_path = get_fixture_path(fixtures_dir, key)
+    os.makedirs(os.path.dirname(fixture_path), exist_ok=True)
+    with open(fixture_path, 'w') as f:
+        json.dump({'key': key} | fixture, f)
+
+def get_callback(query: str) -> str:
+    return dict(urllib.parse.parse_qsl(query)).get('callback')
+
+
+class ReplayHandler(BaseHTTPRequestHandler):
+    server_version = 'HKEXReplay/1.0'
+
+    def do_GET(self):
+        path, _, query = self.path.partition('?')
+        status, content_type, body = self.server.replay.handle(path, query)
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format: str, *args):
+        logger.debug(format % args)
+
+
+@dataclass
+class ReplayServer:
+    "Local stand-in for the HKEX, HSI and HKAB sites serving recorded responses"
+    fixtures_dir: str = REPLAY_DIR
+    host: str = 'localhost'
+    port: int = 8052
+    latency: float = 0 # seconds added to every response
+    jitter: float = 0 # maximum random seconds added on top of latency
+    error_rate: float = 0 # share of requests answered with a 503
+    record: bool = False # fetch from the live site and save fixtures for missing keys
+    seed: int = 1
+    stats: dict[str, int] = field(init=False, default_factory=lambda: {'requests': 0, 'errors': 0, 'missing': 0, 'recorded': 0})
+    _lock: threading.Lock = field(init=False, default_factory=threading.Lock)
+
+    def __post_init__(self):
+        self._rng = random.Random(self.seed)
+        self._httpd = None
+        self._thread = None
+
+    @property
+    def url(self) -> str:
+        return f'http://{self.host}:{self.port}'
+
+    def record_fixture(self, key: str, path: str, query: str) -> dict[str, any]:
+        site_url = f'https://{path.lstrip("/")}' + (f'?{query}' if query else '')
+        response = requests.get(site_url, headers=RECORD_HEADERS, timeout=30)
+        fixture = {
+            'status': response.status_code,
+            'content_type': response.headers.get('Content-Type', 'text/plain'),
+            'callback': get_callback(query),
+            'body': response.text,
+        }
+        if response.ok:
+            save_fixture(self.fixtures_dir, key, fixture)
+            with self._lock:
+                self.stats['recorded'] += 1
+        return fixture
+
+    def handle(self, path: str, query: str) -> tuple[int, str, bytes]:
+        with self._lock:
+            self.stats['requests'] += 1
+            delay = self.latency + self._rng.uniform(0, self.jitter)
+            is_error = self._rng.random() < self.error_rate
+        if delay:
+            time.sleep(delay)
+        if is_error:
+            with self._lock:
+                self.stats['errors'] += 1
+            return 503, 'text/plain', b'Injected error'
+        key = get_fixture_key(path, query)
+        fixture = load_fixture(self.fixtures_dir, key)
+        if fixture is None and self.record:
+            fixture = self.record_fixture(key, path, query)
+        if fixture is None:
+            with self._lock:
+                self.stats['missing'] += 1
+            return 404, 'text/plain', f'No fixture for {key}'.encode()
+        body = fixture['body']
+        # JSONP responses are wrapped in the callback of the current request
+        recorded_callback, callback = fixture.get('callback'), get_callback(query)
+        if recorded_callback and callback and body.startswith(recorded_callback + '('):
+            body = callback + body[len(recorded_callback):]
+        return fixture['status'], fixture['content_type'], body.encode()
+
+    def start(self) -> 'ReplayServer':
+        self._httpd = ThreadingHTTPServer((self.host, self.port), ReplayHandler)
+        self._httpd.daemon_threads = True
+        self._httpd.replay = self
+        self.port = self._httpd.server_address[1]
+        self._thread = threading.Thread(target=self._httpd.serve_forever, name='replay-server', daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        if self._httpd:
+            self._httpd.shutdown()
+            self._httpd.server_close()
+            self._thread.join()
+            self._httpd, self._thread = None, None
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Serve recorded HKEX, HSI and HKAB responses, set HKEX_REPLAY_URL to use it')
+    parser.add_argument('--fixtures-dir', default=REPLAY_DIR)
+    parser.add_argument('--host', default='localhost')
+    parser.add_argument('--port', type=int, default=8052)
+    parser.add_argument('--latency', type=float, default=0)
+    parser.add_argument('--jitter', type=float, default=0)
+    parser.add_argument('--error-rate', type=float, default=0)
+    parser.add_argument('--record', action='store_true')
+    args = parser.parse_args()
+    server = ReplayServer(args.fixtures_dir, args.host, args.port, latency=args.latency, jitter=args.jitter,
+                          error_rate=args.error_rate, record=args.record).start()
+    print(f'Replaying {args.fixtures_dir} at {server.url}')
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        server.stop()
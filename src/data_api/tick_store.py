@@ -0,0 +1,73 @@
+import datetime as dtm
+import json
+import os
+import threading
+
+from common.models.market_data import SessionType
+from data_api.db_config import TICKS_DIR
+
+QUOTES_KIND = 'quotes'
+CHAINS_KIND = 'chains'
+CHARTS_KIND = 'charts'
+
+# snapshots are appended as JSON lines to {TICKS_DIR}/{date}/{kind}/{key}.jsonl
+WRITE_LOCK = threading.Lock()
+
+def get_quotes_key(code: str, session_type: SessionType) -> str:
+    return f'{code}_{session_type.name}'
+
+def get_chain_key(code: str, contract_id: str, session_type: SessionType) -> str:
+    return f'{code}_{contract_id}_{session_type.name}'
+
+def get_snapshot_path(kind: str, key: str, date: dtm.date) -> str:
+    return os.path.join(TICKS_DIR, date.isoformat(), kind, f'{key}.jsonl')
+
+def append_snapshot(kind: str, key: str, data: any, captured: dtm.datetime = None) -> str:
+    captured = captured or dtm.datetime.now()
+    path = get_snapshot_path(kind, key, captured.date())
+    line = json.dumps({'captured': captured.isoformat(), 'data': data}) + '\n'
+    with WRITE_LOCK:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'a') as f:
+            f.write(line)
+    return path
+
+def read_last_line(path: str, block_size: int = 1 << 16) -> bytes:
+    with open(path, 'rb') as f:
+        f.seek(0, os.SEEK_END)
+        end = f.tell()
+        buffer = b''
+        # read backwards until the start of the last complete line is in the buffer
+        while end > 0:
+            start = max(0, end - block_size)
+            f.seek(start)
+            buffer = f.read(end - start) + buffer
+            end = start
+            if buffer.rstrip(b'\n').rfind(b'\n') >= 0:
+                break
+        return buffer.rstrip(b'\n').rsplit(b'\n', 1)[-1]
+
+def get_latest_snapshot(kind: str, key: str, max_age: float = None,
+                        as_of: dtm.datetime = None) -> tuple[dtm.datetime, any]:
+    "Latest stored snapshot of today, None if missing or older than max_age seconds"
+    as_of = as_of or dtm.datetime.now()
+    path = get_snapshot_path(kind, key, as_of.date())
+    if not os.path.exists(path):
+        return None
+    try:
+        snapshot = json.loads(read_last_line(path))
+    except ValueError:
+        # empty file or a line still being written
+        return None
+    captured = dtm.datetime.fromisoformat(snapshot['captured'])
+    if max_age is not None and (as_of - captured).total_seconds() > max_age:
+        return None
+    return captured, snapshot['data']
+
+def read_snapshots(kind: str, key: str, date: dtm.date) -> list[tuple[dtm.datetime, any]]:
+    path = get_snapshot_path(kind, key, date)
+    if not os.path.exists(path):
+        return []
+    with open(path) as f:
+        snapshots = [json.loads(line) for line in f if line.strip()]
+    return [(dtm.datetime.fromisoformat(sn['captured']), sn['data']) for sn in snapshots]
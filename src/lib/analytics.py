@@ -1,23 +1,25 @@
 import datetime as dtm
 import pandas as pd
-import statsmodels.api as sm_api
-import statsmodels.tsa.api as ts_api
 import numpy as np
 import logging
 
 from data_api import hkab_server
 from common.chrono import tenor as tenor_lib
 from common.chrono import daycount
-from common.numeric.interpolator import LogLinear
+from lib.cache import TTLCache
 
 logger = logging.Logger(__name__)
 
 DAYCOUNT = daycount.DayCount.ACT365
-RATES_CURVE: dict[dtm.date, LogLinear] = {}
+RATES_CURVE = TTLCache(max_size=256)
+# curves built on an earlier fixing are reloaded once the value date fixing may be published
+FALLBACK_CURVE_TTL = 900
 MIN_POINTS = 5
 
-def load_discount_curve(value_date: dtm.date):
-    tenors_rates = hkab_server.get_rates(value_date)
+def load_discount_curve(value_date: dtm.date, tenors_rates: dict[str, float] = None):
+    from common.numeric.interpolator import LogLinear
+    if tenors_rates is None:
+        tenors_rates = hkab_server.get_fixing_rates(value_date)
     disc_points = []
     for tenor, rate in tenors_rates.items():
         tenor_date = tenor_lib.Tenor(tenor).get_date(value_date)
@@ -27,15 +29,24 @@ def load_discount_curve(value_date: dtm.date):
     return LogLinear(disc_points, _extrapolate_left=True)
 
 def get_discount_curve(value_date: dtm.date):
-    if value_date not in RATES_CURVE:
-        RATES_CURVE[value_date] = load_discount_curve(value_date)
-    return RATES_CURVE[value_date]
+    curve = RATES_CURVE.get(value_date)
+    if curve is None:
+        fixing_date, tenors_rates = hkab_server.get_fixing(value_date)
+        curve = load_discount_curve(value_date, tenors_rates)
+        RATES_CURVE.set(value_date, curve, ttl=FALLBACK_CURVE_TTL if fixing_date != value_date else None)
+    return curve
+
+def prefetch_discount_curves(from_date: dtm.date, to_date: dtm.date) -> int:
+    "Backfill the fixings store for the range so curve loads avoid one request per date"
+    return hkab_server.backfill_rates(from_date, to_date)
 
 def get_hedge_ratio(value_date: dtm.date, expiry_date: dtm.date) -> float:
     contract_dcf = DAYCOUNT.get_dcf(value_date, expiry_date)
     return 1 / get_discount_curve(value_date).get_value(contract_dcf)
 
 def get_beta_matrix(stock_prices: dict[str, pd.Series], index_prices: dict[str, pd.Series]) -> dict[str, dict[str, float]]:
+    # statsmodels takes longer to import than the rest of the app, only the unbatched paths use it
+    import statsmodels.api as sm_api
     stock_returns = {k: stk_p.dropna().pct_change() for k, stk_p in stock_prices.items()}
     index_returns = {k: idx_p.dropna().pct_change() for k, idx_p in index_prices.items()}
     betas = {}
@@ -53,7 +64,36 @@ def get_beta_matrix(stock_prices: dict[str, pd.Series], index_prices: dict[str,
             betas[idx_n][sn] = res.params
     return betas
 
+def get_returns_matrix(prices: dict[str, pd.Series]) -> pd.DataFrame:
+    return pd.DataFrame({k: p.dropna().pct_change() for k, p in prices.items()})
+
+def get_beta_matrix_batched(stock_prices: dict[str, pd.Series], index_prices: dict[str, pd.Series]) -> dict[str, dict[str, np.ndarray]]:
+    returns = pd.concat([get_returns_matrix(stock_prices), get_returns_matrix(index_prices)],
+                        axis=1, keys=['stock', 'index'])
+    stock_names, index_names = list(returns['stock'].columns), list(returns['index'].columns)
+    y, x = returns['stock'].to_numpy(dtype=np.float64), returns['index'].to_numpy(dtype=np.float64)
+    # pairwise complete observations: zero out missing values and count overlaps via mask products
+    y_mask, x_mask = ~np.isnan(y), ~np.isnan(x)
+    y, x = np.where(y_mask, y, 0), np.where(x_mask, x, 0)
+    y_m, x_m = y_mask.astype(np.float64), x_mask.astype(np.float64)
+    count = x_m.T @ y_m
+    sum_x, sum_y = x.T @ y_m, x_m.T @ y
+    sum_xx, sum_xy = (x * x).T @ y_m, x.T @ y
+    with np.errstate(divide='ignore', invalid='ignore'):
+        slope = (count * sum_xy - sum_x * sum_y) / (count * sum_xx - sum_x * sum_x)
+        intercept = (sum_y - slope * sum_x) / count
+    betas = {}
+    for i, idx_n in enumerate(index_names):
+        betas[idx_n] = {}
+        for j, sn in enumerate(stock_names):
+            if count[i, j] < MIN_POINTS or not np.isfinite(slope[i, j]):
+                logger.error(f'{sn} data points are not valid')
+                continue
+            betas[idx_n][sn] = np.array([slope[i, j], intercept[i, j]])
+    return betas
+
 def get_autocorrelation(stock_prices: dict[str, pd.Series]) -> dict[str, tuple[int, float]]:
+    import statsmodels.tsa.api as ts_api
     stock_returns = {k: stk_p.dropna().pct_change() for k, stk_p in stock_prices.items()}
     res = {}
     for sn, stk_r in stock_returns.items():
@@ -65,3 +105,47 @@ def get_autocorrelation(stock_prices: dict[str, pd.Series]) -> dict[str, tuple[i
         pac_i = np.argmax([abs(x) for x in pac_v[1:]]) + 1
         res[sn] = (pac_i, pac_v[pac_i])
     return res
+
+def get_pacf_batched(values: list[np.ndarray]) -> tuple[np.ndarray, np.ndarray]:
+    # adjusted Yule-Walker PACF (statsmodels pacf default) for many series at once
+    nobs = np.array([len(v) for v in values])
+    nlags = np.maximum(np.minimum((10 * np.log10(nobs)).astype(int), nobs // 2 - 1), 1)
+    max_lag = nlags.max()
+    x = np.zeros((len(values), nobs.max()))
+    for i, v in enumerate(values):
+        x[i, :nobs[i]] = v - v.mean()
+    # autocovariances from the FFT power spectrum, zero padded to avoid wrap-around
+    n_fft = 1 << int(2 * x.shape[1] - 1).bit_length()
+    x_f = np.fft.rfft(x, n=n_fft, axis=1)
+    acov = np.fft.irfft(x_f * np.conj(x_f), n=n_fft, axis=1)[:, :max_lag + 1]
+    denom = np.maximum(nobs[:, None] - np.arange(max_lag + 1)[None, :], 1)
+    denom[:, 0] = nobs
+    acov /= denom
+    # Durbin-Levinson recursion vectorized across series
+    pacf = np.zeros((len(values), max_lag + 1))
+    pacf[:, 0] = 1
+    phi = np.zeros((len(values), max_lag + 1))
+    var = acov[:, 0].copy()
+    for k in range(1, max_lag + 1):
+        phi_kk = (acov[:, k] - np.einsum('ij,ij->i', phi[:, 1:k], acov[:, k-1:0:-1])) / var
+        phi[:, 1:k] = phi[:, 1:k] - phi_kk[:, None] * phi[:, k-1:0:-1]
+        phi[:, k] = phi_kk
+        var *= (1 - phi_kk * phi_kk)
+        pacf[:, k] = phi_kk
+    return pacf, nlags
+
+def get_autocorrelation_batched(stock_prices: dict[str, pd.Series]) -> dict[str, tuple[int, float]]:
+    stock_returns = {}
+    for sn, stk_p in stock_prices.items():
+        stk_r_v = stk_p.dropna().pct_change().dropna().to_numpy(dtype=np.float64)
+        if len(stk_r_v) < MIN_POINTS:
+            logger.info(f'{sn} data points are not valid')
+            continue
+        stock_returns[sn] = stk_r_v
+    if not stock_returns:
+        return {}
+    pacf, nlags = get_pacf_batched(list(stock_returns.values()))
+    lags = np.arange(pacf.shape[1])
+    pac_abs = np.where((lags[None, :] >= 1) & (lags[None, :] <= nlags[:, None]), np.abs(pacf), -1)
+    pac_i = np.argmax(pac_abs, axis=1)
+    return {sn: (pac_i[i], pacf[i, pac_i[i]]) for i, sn in enumerate(stock_returns)}
@@ -0,0 +1,62 @@
+from dataclasses import dataclass, field
+from collections import OrderedDict
+from typing import Callable, Hashable
+import threading
+import time
+
+
+@dataclass
+class TTLCache:
+    "Thread-safe LRU cache with per entry expiry"
+    max_size: int = 256
+    ttl: float = None # default expiry in seconds, None to keep until evicted
+    hits: int = field(init=False, default=0)
+    misses: int = field(init=False, default=0)
+    _entries: OrderedDict = field(init=False, default_factory=OrderedDict)
+    _lock: threading.Lock = field(init=False, default_factory=threading.Lock)
+
+    @property
+    def size(self) -> int:
+        return len(self._entries)
+
+    def get(self, key: Hashable, default: any = None) -> any:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                expiry, value = entry
+                if expiry is None or expiry > time.monotonic():
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return value
+                del self._entries[key]
+            self.misses += 1
+            return default
+
+    def set(self, key: Hashable, value: any, ttl: float = None):
+        ttl = self.ttl if ttl is None else ttl
+        expiry = time.monotonic() + ttl if ttl is not None else None
+        with self._lock:
+            self._entries[key] = (expiry, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def get_or_load(self, key: Hashable, loader: Callable[[], any], ttl: float = None) -> any:
+        missing = object()
+        value = self.get(key, missing)
+        if value is missing:
+            value = loader()
+            self.set(key, value, ttl=ttl)
+        return value
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.hits, self.misses = 0, 0
+
+    def get_stats(self) -> dict[str, float]:
+        lookups = self.hits + self.misses
+        return {
+            'size': self.size, 'hits': self.hits, 'misses': self.misses,
+            'hit_rate': self.hits / lookups if lookups else 0,
+        }
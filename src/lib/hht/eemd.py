@@ -1,17 +1,50 @@
 from pydantic.dataclasses import dataclass
+from concurrent.futures import ProcessPoolExecutor
 from random import Random
 import numpy as np
 
 from lib.hht import emd
 
+def decompose_trial(emd_obj: emd.EMD, xs: np.ndarray, ys: np.ndarray, noise: np.ndarray):
+    return emd_obj.decompose_array(xs, ys + noise), emd_obj.decompose_array(xs, ys - noise)
+
 @dataclass
 class EEMD:
     "Ensemble EMD"
     max_IMFs: int = 7
     max_iterations: int = 0
     num_trials: int = 100
+    batched: bool = False # seeded noise matrix and array reduction over the ensemble
+    num_workers: int = 1 # processes used for trials in batched mode
+    seed: int = 1
+
+    def decompose_batched(self, series: dict[int, float]):
+        emd_obj = emd.EMD(max_IMFs=self.max_IMFs, max_iterations=self.max_iterations, vectorized=True)
+        xs_in = list(series.keys())
+        xs = np.fromiter(xs_in, dtype=np.float64, count=len(xs_in))
+        ys = np.fromiter(series.values(), dtype=np.float64, count=len(xs_in))
+        rng = np.random.default_rng(self.seed)
+        noise = rng.normal(loc=ys.mean(), scale=ys.std(), size=(self.num_trials, len(ys)))
+        trial_args = ([emd_obj] * self.num_trials, [xs] * self.num_trials, [ys] * self.num_trials, noise)
+        if self.num_workers > 1:
+            # map preserves trial order so the result only depends on the seed
+            with ProcessPoolExecutor(max_workers=self.num_workers) as executor:
+                trials = list(executor.map(decompose_trial, *trial_args,
+                                           chunksize=max(1, self.num_trials // (4 * self.num_workers))))
+        else:
+            trials = list(map(decompose_trial, *trial_args))
+        ensemble_imfs = []
+        for imfs_plus, imfs_minus in trials:
+            if len(imfs_plus) == len(imfs_minus):
+                ensemble_imfs.append(imfs_plus)
+                ensemble_imfs.append(imfs_minus)
+        num_imfs = int(np.median([len(en_i) for en_i in ensemble_imfs]))
+        ensemble_res = np.stack([en_i for en_i in ensemble_imfs if len(en_i) == num_imfs])
+        return [list(zip(xs_in, imf.tolist())) for imf in ensemble_res.mean(axis=0)]
 
     def decompose(self, series: dict[int, float]):
+        if self.batched:
+            return self.decompose_batched(series)
         emd_obj = emd.EMD(max_IMFs=self.max_IMFs, max_iterations=self.max_iterations)
 
         rand = Random(1) # seed for reproducibility
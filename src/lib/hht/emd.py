@@ -1,4 +1,7 @@
 from pydantic.dataclasses import dataclass
+from scipy import interpolate
+import numpy as np
+
 from common.numeric.interpolator import BSpline
 
 # MIN_POINTS = 5
@@ -53,13 +56,83 @@ def eval_sifting(series: list[tuple[int, float]], max_iterations: int = 0):
         return proto_imf
     return None
 
+# array-backed equivalents of the list based functions above
+def get_extrema_array(xs: np.ndarray, ys: np.ndarray):
+    # drop repeated values so that plateaus collapse to their first point
+    keep = np.flatnonzero(np.concatenate(([True], np.diff(ys) != 0)))
+    if len(keep) < 3:
+        empty = np.empty(0)
+        return (empty, empty), (empty, empty)
+    x_k, y_k = xs[keep], ys[keep]
+    d_prev, d_next = np.diff(y_k[:-1]), np.diff(y_k[1:])
+    x_mid, x_next, y_mid = x_k[1:-1], x_k[2:], y_k[1:-1]
+    # plateau extrema are placed in the middle of the flat section
+    x_mid = np.where(x_next > x_mid + 1, np.trunc((x_mid + x_next - 1) / 2), x_mid)
+    is_min = (d_next > 0) & (d_prev < 0)
+    is_max = (d_next < 0) & (d_prev > 0)
+    return (x_mid[is_min], y_mid[is_min]), (x_mid[is_max], y_mid[is_max])
+
+def get_spline_values(knots: tuple[np.ndarray, np.ndarray], xs: np.ndarray) -> np.ndarray:
+    knot_xs, knot_ys = knots
+    inside = (xs >= knot_xs[0]) & (xs <= knot_xs[-1])
+    values = np.empty(len(xs))
+    # cubic interpolant between the extrema in one call
+    values[inside] = interpolate.make_interp_spline(knot_xs, knot_ys, k=3)(xs[inside])
+    # the few points beyond the end extrema keep the boundary handling of get_envelope
+    outside = np.flatnonzero(~inside)
+    if len(outside):
+        spline = BSpline(list(zip(knot_xs.tolist(), knot_ys.tolist())), _extrapolate_left=True)
+        values[outside] = [spline.get_value(x_i) for x_i in xs[outside].tolist()]
+    return values
+
+def get_envelope_array(xs: np.ndarray, ys: np.ndarray):
+    minima, maxima = get_extrema_array(xs, ys)
+    if len(maxima[0]) < MIN_SPLINE_POINTS or len(minima[0]) < MIN_SPLINE_POINTS:
+        return None
+    return (get_spline_values(maxima, xs) + get_spline_values(minima, xs)) / 2
+
+def eval_sifting_array(xs: np.ndarray, ys: np.ndarray, max_iterations: int = 0):
+    proto_imf, s_i = ys, 0
+    while(max_iterations == 0 or s_i < max_iterations):
+        mean_envelope = get_envelope_array(xs, proto_imf)
+        if mean_envelope is None:
+            break
+        with np.errstate(divide='ignore', invalid='ignore'):
+            error = mean_envelope * mean_envelope / proto_imf * proto_imf
+        if error.sum() < ERROR_THRESHOLD:
+            break
+        proto_imf = proto_imf - mean_envelope
+        s_i += 1
+    if s_i > 0:
+        return proto_imf
+    return None
+
 @dataclass
 class EMD:
     "Emperical Mode Decomposition"
     max_IMFs: int = 7 # maximum number of components
     max_iterations: int = 0 # maximum iterations per each sifting
+    vectorized: bool = False # sift on float64 arrays instead of lists of points
+
+    def decompose_array(self, xs: np.ndarray, ys: np.ndarray) -> np.ndarray:
+        xs = np.ascontiguousarray(xs, dtype=np.float64)
+        residue, k = np.array(ys, dtype=np.float64), 0
+        imfs = []
+        while(self.max_IMFs == 0 or k < self.max_IMFs):
+            imf = eval_sifting_array(xs, residue, max_iterations=self.max_iterations)
+            if imf is None:
+                break
+            residue -= imf
+            imfs.append(imf)
+            k += 1
+        return np.array(imfs).reshape(len(imfs), len(xs))
 
     def decompose(self, series: dict[int, float]):
+        if self.vectorized:
+            xs = list(series.keys())
+            imfs = self.decompose_array(np.fromiter(xs, dtype=np.float64, count=len(xs)),
+                                        np.fromiter(series.values(), dtype=np.float64, count=len(xs)))
+            return [list(zip(xs, imf.tolist())) for imf in imfs]
         residue, k = list(series.items()), 0
         imfs = []
         while(self.max_IMFs == 0 or k < self.max_IMFs):
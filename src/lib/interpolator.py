@@ -2,6 +2,7 @@
 from pydantic.dataclasses import dataclass
 from dataclasses import InitVar
 from scipy import interpolate
+import numpy as np
 
 
 @dataclass
@@ -29,6 +30,21 @@ class Interpolator3D:
     def get_value(self, _: float, __: float):
         raise RuntimeError("Abstract function: get_value")
 
+    def get_values(self, xs: list[float], ys: list[float]) -> np.ndarray:
+        return np.array([[self.get_value(x, y) for y in ys] for x in xs])
+
+    def get_grid(self) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+        "Unique axes and z matrix if the points form a complete grid"
+        x_axis, x_ids = np.unique(self._xs, return_inverse=True)
+        y_axis, y_ids = np.unique(self._ys, return_inverse=True)
+        if x_axis.size * y_axis.size != self.size:
+            return None
+        zs = np.full((x_axis.size, y_axis.size), np.nan)
+        zs[x_ids, y_ids] = self._zs
+        if np.isnan(zs).any():
+            return None
+        return x_axis, y_axis, zs
+
 # https://docs.scipy.org/doc/scipy/reference/generated/scipy.interpolate.bisplrep.html#scipy.interpolate.bisplrep
 BUFFER_EXTRAP = 0.1
 @dataclass
@@ -38,7 +54,24 @@ class Spline3D(Interpolator3D):
         super().__post_init__(xyz_init)
         yb, ye = min(self._ys), max(self._ys)
         yb, ye = yb - abs(yb) * BUFFER_EXTRAP, ye + abs(ye) * BUFFER_EXTRAP
-        self.bispline_tck = interpolate.bisplrep(self._xs, self._ys, self._zs, yb=yb, ye=ye, kx=1, ky=1)
+        grid = self.get_grid()
+        if grid is not None and min(grid[0].size, grid[1].size) > 1:
+            x_axis, y_axis, zs = grid
+            # same bounds and default smoothing as bisplrep
+            spline = interpolate.RectBivariateSpline(x_axis, y_axis, zs,
+                bbox=[x_axis[0], x_axis[-1], yb, ye], kx=1, ky=1, s=self.size - np.sqrt(2 * self.size))
+            self.bispline_tck = spline.tck + spline.degrees
+        else:
+            self.bispline_tck = interpolate.bisplrep(self._xs, self._ys, self._zs, yb=yb, ye=ye, kx=1, ky=1)
 
     def get_value(self, x: float, y: float) -> float:
         return interpolate.bisplev(x, y, self.bispline_tck)
+
+    def get_values(self, xs: list[float], ys: list[float]) -> np.ndarray:
+        "Values on the grid xs × ys in a single bisplev call"
+        xs, ys = np.asarray(xs, dtype=float), np.asarray(ys, dtype=float)
+        x_order, y_order = np.argsort(xs), np.argsort(ys)
+        values = np.atleast_2d(interpolate.bisplev(xs[x_order], ys[y_order], self.bispline_tck))
+        res = np.empty_like(values)
+        res[np.ix_(x_order, y_order)] = values
+        return res
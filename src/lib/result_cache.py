@@ -0,0 +1,113 @@
+from dataclasses import dataclass, field
+from typing import Callable
+import hashlib
+import logging
+import os
+import pickle
+import sqlite3
+import time
+
+from data_api.db_config import RESULT_CACHE_DB
+
+logger = logging.Logger(__name__)
+
+RESULTS_TABLE = 'results'
+
+
+@dataclass
+class ResultCache:
+    "Pickled results in SQLite shared across processes, keyed by name and inputs"
+    path: str
+    ttl: float = 3600
+    lease: float = 600 # seconds a process may hold a key while computing it
+    poll_interval: float = 0.5
+    _initialized: bool = field(init=False, default=False)
+
+    def connect(self) -> sqlite3.Connection:
+        if not self._initialized:
+            os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+        conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+        if not self._initialized:
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute(f"CREATE TABLE IF NOT EXISTS {RESULTS_TABLE} ("
+                         "key TEXT PRIMARY KEY, value BLOB, expires_at REAL, lease_until REAL)")
+            self._initialized = True
+        return conn
+
+    @staticmethod
+    def get_key(name: str, inputs: tuple) -> str:
+        return hashlib.sha256(repr((name, inputs)).encode()).hexdigest()
+
+    def get(self, key: str) -> any:
+        conn = self.connect()
+        try:
+            row = conn.execute(f"SELECT value FROM {RESULTS_TABLE} WHERE key=? AND value IS NOT NULL AND expires_at>?",
+                               (key, time.time())).fetchone()
+        finally:
+            conn.close()
+        return pickle.loads(row[0]) if row else None
+
+    def set(self, key: str, value: any, ttl: float = None):
+        ttl = self.ttl if ttl is None else ttl
+        conn = self.connect()
+        try:
+            conn.execute(f"INSERT OR REPLACE INTO {RESULTS_TABLE} VALUES (?, ?, ?, NULL)",
+                         (key, pickle.dumps(value), time.time() + ttl))
+        finally:
+            conn.close()
+
+    def acquire(self, key: str) -> bool:
+        "Takes the compute lease for key unless a live result or another lease exists"
+        conn = self.connect()
+        try:
+            conn.execute('BEGIN IMMEDIATE')
+            now = time.time()
+            row = conn.execute(f"SELECT value IS NOT NULL AND expires_at>?, lease_until FROM {RESULTS_TABLE} WHERE key=?",
+                               (now, key)).fetchone()
+            if row and (row[0] or (row[1] or 0) > now):
+                conn.execute('ROLLBACK')
+                return False
+            conn.execute(f"INSERT OR REPLACE INTO {RESULTS_TABLE} VALUES (?, NULL, 0, ?)", (key, now + self.lease))
+            conn.execute('COMMIT')
+            return True
+        finally:
+            conn.close()
+
+    def release(self, key: str):
+        conn = self.connect()
+        try:
+            conn.execute(f"DELETE FROM {RESULTS_TABLE} WHERE key=? AND value IS NULL", (key,))
+        finally:
+            conn.close()
+
+    def get_or_compute(self, name: str, inputs: tuple, loader: Callable[[], any], ttl: float = None) -> any:
+        "Cached result, waiting on another process computing the same inputs instead of duplicating it"
+        key = self.get_key(name, inputs)
+        deadline = time.time() + self.lease
+        while True:
+            value = self.get(key)
+            if value is not None:
+                return value
+            if self.acquire(key):
+                break
+            if time.time() > deadline:
+                logger.warning(f'Lease wait expired for {name} {inputs}')
+                return loader()
+            time.sleep(self.poll_interval)
+        try:
+            value = loader()
+            if value is not None:
+                self.set(key, value, ttl=ttl)
+        finally:
+            # no-op once set has stored the value
+            self.release(key)
+        return value
+
+    def clear(self):
+        conn = self.connect()
+        try:
+            conn.execute(f"DELETE FROM {RESULTS_TABLE}")
+        finally:
+            conn.close()
+
+RESULT_CACHE = ResultCache(RESULT_CACHE_DB)
@@ -0,0 +1,197 @@
+from dataclasses import dataclass, field
+from contextlib import contextmanager
+from typing import Callable
+import bisect
+import cProfile
+import functools
+import glob
+import io
+import json
+import logging
+import os
+import pstats
+import sqlite3
+import threading
+import time
+
+from data_api.db_config import TIMING_DIR
+
+logger = logging.Logger(__name__)
+
+# upper bounds in seconds of the latency histogram buckets, the last bucket is unbounded
+BUCKET_BOUNDS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+STATS_DB = os.path.join(TIMING_DIR, 'stages.db')
+STATS_TABLE = 'stages'
+PROFILE_FLAG = os.path.join(TIMING_DIR, 'profile.on')
+PROFILES_DIR = os.path.join(TIMING_DIR, 'profiles')
+PROFILE_LINES = 40
+
+
+@dataclass
+class StageStats:
+    "Call count, total and latency histogram of a timed stage"
+    count: int = 0
+    total: float = 0
+    max: float = 0
+    buckets: list[int] = field(default_factory=lambda: [0] * (len(BUCKET_BOUNDS) + 1))
+
+    def add(self, elapsed: float):
+        self.count += 1
+        self.total += elapsed
+        self.max = max(self.max, elapsed)
+        self.buckets[bisect.bisect_left(BUCKET_BOUNDS, elapsed)] += 1
+
+    def merge(self, other: 'StageStats'):
+        self.count += other.count
+        self.total += other.total
+        self.max = max(self.max, other.max)
+        self.buckets = [b1 + b2 for b1, b2 in zip(self.buckets, other.buckets)]
+
+    def get_quantile(self, q: float) -> float:
+        "Upper bound of the bucket holding the quantile"
+        rank, cumulative = q * self.count, 0
+        for bound, count in zip(BUCKET_BOUNDS + (self.max,), self.buckets):
+            cumulative += count
+            if cumulative >= rank:
+                return min(bound, self.max)
+        return self.max
+
+# stages recorded by this process since its last flush
+STAGES: dict[str, StageStats] = {}
+STAGES_LOCK = threading.Lock()
+
+def clear_inherited_stages():
+    # a forked callback job starts without the stages of the server process
+    global STAGES_LOCK
+    STAGES_LOCK = threading.Lock()
+    STAGES.clear()
+
+os.register_at_fork(after_in_child=clear_inherited_stages)
+
+def record(name: str, elapsed: float):
+    with STAGES_LOCK:
+        stage = STAGES.get(name)
+        if stage is None:
+            stage = STAGES[name] = StageStats()
+        stage.add(elapsed)
+
+@contextmanager
+def timed(name: str):
+    "Records the wall time of the block or decorated function under the stage name"
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        record(name, time.perf_counter() - start)
+
+def connect() -> sqlite3.Connection:
+    os.makedirs(TIMING_DIR, exist_ok=True)
+    conn = sqlite3.connect(STATS_DB, timeout=30, isolation_level=None)
+    conn.execute(f"CREATE TABLE IF NOT EXISTS {STATS_TABLE} ("
+                 "name TEXT PRIMARY KEY, count INTEGER, total REAL, max REAL, buckets TEXT)")
+    return conn
+
+def load_saved_stats(conn: sqlite3.Connection) -> dict[str, StageStats]:
+    return {row[0]: StageStats(row[1], row[2], row[3], json.loads(row[4]))
+            for row in conn.execute(f"SELECT name, count, total, max, buckets FROM {STATS_TABLE}")}
+
+def reset():
+    with STAGES_LOCK:
+        STAGES.clear()
+    conn = connect()
+    try:
+        conn.execute(f"DELETE FROM {STATS_TABLE}")
+    finally:
+        conn.close()
+
+def save_stats():
+    "Adds the stages recorded since the last save to the stats shared by all processes"
+    global STAGES
+    with STAGES_LOCK:
+        stages, STAGES = STAGES, {}
+    if not stages:
+        return
+    try:
+        conn = connect()
+        try:
+            conn.execute('BEGIN IMMEDIATE')
+            saved = load_saved_stats(conn)
+            for name, stage in stages.items():
+                saved.setdefault(name, StageStats()).merge(stage)
+            conn.executemany(f"INSERT OR REPLACE INTO {STATS_TABLE} VALUES (?, ?, ?, ?, ?)",
+                             [(name, saved[name].count, saved[name].total, saved[name].max, json.dumps(saved[name].buckets))
+                              for name in stages])
+            conn.execute('COMMIT')
+        finally:
+            conn.close()
+    except sqlite3.Error:
+        # keep the unsaved stages for the next save
+        with STAGES_LOCK:
+            for name, stage in stages.items():
+                STAGES.setdefault(name, StageStats()).merge(stage)
+        raise
+
+def load_stats() -> dict[str, StageStats]:
+    "Saved stages of all processes merged with the unsaved ones of this process"
+    conn = connect()
+    try:
+        merged = load_saved_stats(conn)
+    finally:
+        conn.close()
+    with STAGES_LOCK:
+        for name, stage in STAGES.items():
+            merged.setdefault(name, StageStats()).merge(stage)
+    return merged
+
+def get_stats_rows() -> list[dict[str, any]]:
+    return [{
+        'Stage': name, 'Count': stage.count, 'Total (s)': stage.total,
+        'Mean (ms)': stage.total / stage.count * 1e3 if stage.count else 0,
+        'P50 (ms)': stage.get_quantile(0.5) * 1e3, 'P95 (ms)': stage.get_quantile(0.95) * 1e3,
+        'Max (ms)': stage.max * 1e3,
+    } for name, stage in sorted(load_stats().items())]
+
+def is_profiling() -> bool:
+    return os.path.exists(PROFILE_FLAG)
+
+def set_profiling(enabled: bool):
+    os.makedirs(TIMING_DIR, exist_ok=True)
+    if enabled:
+        open(PROFILE_FLAG, 'w').close()
+    elif os.path.exists(PROFILE_FLAG):
+        os.remove(PROFILE_FLAG)
+
+def save_profile(name: str, profile: cProfile.Profile):
+    stream = io.StringIO()
+    pstats.Stats(profile, stream=stream).sort_stats(pstats.SortKey.CUMULATIVE).print_stats(PROFILE_LINES)
+    os.makedirs(PROFILES_DIR, exist_ok=True)
+    with open(os.path.join(PROFILES_DIR, f'{name}.txt'), 'w') as f:
+        f.write(stream.getvalue())
+
+def load_profiles() -> dict[str, str]:
+    profiles = {}
+    for path in sorted(glob.glob(os.path.join(PROFILES_DIR, '*.txt'))):
+        with open(path) as f:
+            profiles[os.path.basename(path)[:-len('.txt')]] = f.read()
+    return profiles
+
+def instrument_callback(name: str) -> Callable:
+    "Times a Dash callback, with a cProfile capture when profiling is switched on, and saves the process stats"
+    def decorator(func: Callable) -> Callable:
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            profile = cProfile.Profile() if is_profiling() else None
+            try:
+                with timed(f'callback.{name}'):
+                    if profile is None:
+                        return func(*args, **kwargs)
+                    return profile.runcall(func, *args, **kwargs)
+            finally:
+                if profile is not None:
+                    save_profile(name, profile)
+                try:
+                    save_stats()
+                except (OSError, sqlite3.Error) as ex:
+                    logger.warning(f'Unable to save timing stats: {ex}')
+        return wrapper
+    return decorator
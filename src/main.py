@@ -1,21 +1,44 @@
 import datetime as dtm
+from typing import Callable, TYPE_CHECKING
 import logging
 
 from common.chrono.tenor import Tenor
-from common.app import plotter
-from volatility.lib import plotter as vol_plotter
-from volatility.models.vol_types import VolatilityModelType
+from common.models.base_instrument import BaseInstrument
 
 from data_api import hkex_client
-from market import hk_eq_vol, hk_equity
+from market import hk_equity
+from lib import timing
+
+if TYPE_CHECKING:
+    # the volatility models load on the first surface request, not at app start
+    from market import hk_eq_vol
 
 logger = logging.Logger('')
 logger.setLevel(logging.INFO)
 
+# prices before the earliest lookback date needed for returns over holidays
+HISTORY_BUFFER = dtm.timedelta(days=10)
+
+def get_latest_prices(instruments: list[BaseInstrument], as_of: dtm.date) -> dict[str, float]:
+    prices, missing = {}, []
+    for c in instruments:
+        try:
+            prices[c.name] = c.data.get_latest_value(as_of)
+        except IndexError:
+            # no close inside the loaded window, e.g. a long suspended counter
+            prices[c.name] = None
+            missing.append(c)
+    if missing:
+        last_closes = hkex_client.get_last_closes([c.data_id for c in missing], as_of)
+        for c in missing:
+            prices[c.name] = last_closes.get(c.data_id)
+    return prices
 
-def get_analytics_table(as_of: dtm.date = None, tenors: list[str] = None) -> dict[str, dict[str, float]]:
-    stocks = hkex_client.get_stocks(True)
-    indices = hkex_client.get_indices(True)
+
+def get_analytics_table(as_of: dtm.date = None, tenors: list[str] = None,
+                        progress: Callable[[int, int], None] = None) -> dict[str, dict[str, float]]:
+    stocks = hkex_client.get_stocks()
+    indices = hkex_client.get_indices()
     returns, betas, lags = {}, {}, {}
     if not tenors:
         tenors = ['1m', '2m', '3m', '6m', '1y', '2y']
@@ -23,33 +46,55 @@ def get_analytics_table(as_of: dtm.date = None, tenors: list[str] = None) -> dic
         current_date = as_of
     else:
         current_date = hkex_client.get_last_date(indices[0].data_id)
-    returns['Price'] = {c.name: c.data.get_latest_value(current_date) for c in indices + stocks}
+    first_date = current_date
     for t in tenors:
+        first_date = Tenor(f'-{t}').get_date(first_date)
+    with timing.timed('analytics.load_histories'):
+        panel = hkex_client.load_histories(indices + stocks, from_date=first_date - HISTORY_BUFFER, to_date=current_date)
+    returns['Price'] = get_latest_prices(indices + stocks, current_date)
+    for t_i, t in enumerate(tenors):
         lookback_date = Tenor(f'-{t}').get_date(current_date)
         t_label = f'{t} {current_date}'
-        returns[t_label] = hk_equity.get_returns(indices + stocks, lookback_date, to_date=current_date)
-        beta_mtx = hk_equity.get_stocks_beta(stocks, indices, lookback_date, to_date=current_date)
+        with timing.timed('analytics.returns'):
+            returns[t_label] = hk_equity.get_returns(indices + stocks, lookback_date, to_date=current_date)
+        with timing.timed('analytics.beta'):
+            beta_mtx = hk_equity.get_stocks_beta(stocks, indices, lookback_date, to_date=current_date, panel=panel)
         for idx_n, vv in beta_mtx.items():
             betas[f'{t}-{idx_n}'] = {kkk: vvv[0] for kkk, vvv in vv.items()}
-        stk_lags = hk_equity.get_lag_correlations(stocks, lookback_date, to_date=current_date)
+        with timing.timed('analytics.lags'):
+            stk_lags = hk_equity.get_lag_correlations(stocks, lookback_date, to_date=current_date, panel=panel)
         lags[t_label] = stk_lags
         current_date = lookback_date
+        if progress:
+            progress(t_i + 1, len(tenors))
     return {'Return': returns, 'Beta': betas, 'Lag': lags}
 
 
-def get_futures_data():
-    indices = hkex_client.get_index_derivatives(True)
+def get_futures_data(progress: Callable[[int, int], None] = None):
+    indices = hkex_client.get_index_derivatives()
     plot_params = dict(title='Calendar Spreads', x_name = 'Time', x_format = '%H:%M',
                        y_name='Price', y2_name='Spread %', y2_format=',.3%')
-    for idx in indices:
-        yield idx.name, hk_equity.get_index_futures_spread(idx), plot_params
+    for idx_name, spread_data in hk_equity.get_index_futures_spreads(indices, progress=progress).items():
+        yield idx_name, spread_data, plot_params
 
 def get_option_models():
+    from market import hk_eq_vol
     indices = hkex_client.get_index_derivatives()
     vol_models = hk_eq_vol.construct([idx.derivatives_id for idx in indices])
     return vol_models
 
+def get_option_surfaces(model_type: str, max_workers: int = None,
+                        progress: Callable[[int, int], None] = None) -> list['hk_eq_vol.SurfaceResult']:
+    from market import hk_eq_vol
+    indices = hkex_client.get_index_derivatives()
+    return hk_eq_vol.get_surfaces([idx.derivatives_id for idx in indices], model_type,
+                                  max_workers=max_workers, progress=progress)
+
 if __name__ == "__main__":
+    from common.app import plotter
+    from volatility.lib import plotter as vol_plotter
+    from volatility.models.vol_types import VolatilityModelType
+    from market import hk_eq_vol
     logger.warning(f"Starting at {dtm.datetime.now()}")
     get_analytics_table()
     # stocks_beta_spread = equity_hk.get_stock_intraday_data(beta_mtx)
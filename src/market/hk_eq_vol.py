@@ -1,49 +1,255 @@
-from common.models.market_data import MarketDataType, OptionDataFlag, SessionType
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+from dataclasses import dataclass
+from typing import Callable
+import datetime as dtm
+import logging
+import time
+import numpy as np
+
+from common.models.market_data import MarketDataType, SessionType, InstrumentDataModel
 from volatility.instruments.listed_option import CallOption, PutOption
 from volatility.models.listed_options_construct import ListedOptionsConstruct, ModelStrikeSlice, ModelStrikeLine
 
 from data_api import hkex_client, hkex_server
+from instruments.equity_index import EquityIndexFuture
 from lib import analytics
+from lib.result_cache import RESULT_CACHE
+from lib import timing
 
-def get_vol_model(code: str, session_type: SessionType = None):
-    price_type, weight_type = MarketDataType.MID, MarketDataType.SPREAD
+logger = logging.Logger(__name__)
+
+MAX_FETCH_WORKERS = 16
+
+def get_option_contract_id(future: EquityIndexFuture) -> str:
+    return future.expiry.strftime('%m%Y')
+
+def load_vol_inputs(code: str, session_type: SessionType = None) -> tuple[list[EquityIndexFuture], dtm.datetime, dict]:
     futures_list = hkex_client.get_futures_contracts(code, session_type=session_type)
-    update_dtm, quotes = hkex_server.load_futures_quotes(code, session_type=session_type)
-    value_date = update_dtm.date()
-    discount_curve = analytics.get_discount_curve(value_date)
-    option_chain = []
+    update_dtm, quotes = hkex_client.get_futures_quotes(code, session_type=session_type)
+    return futures_list, update_dtm, quotes
+
+def fetch_option_chains(chain_keys: list[tuple[str, str]], session_type: SessionType = None,
+                        max_workers: int = MAX_FETCH_WORKERS, return_exceptions: bool = False
+                        ) -> dict[tuple[str, str], hkex_server.OptionChainArrays]:
+    if not chain_keys:
+        return {}
+    def fetch_chain(key: tuple[str, str]):
+        try:
+            return hkex_client.get_options_chain_arrays(*key, session_type=session_type)
+        except Exception as ex:
+            if not return_exceptions:
+                raise
+            return ex
+    with ThreadPoolExecutor(max_workers=min(max_workers, len(chain_keys))) as executor:
+        return dict(zip(chain_keys, executor.map(fetch_chain, chain_keys)))
+
+def get_mid_weights(bid: np.ndarray, ask: np.ndarray, valid: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    "Mid prices (NaN without a two-sided quote) and inverse spread weights"
+    with np.errstate(divide='ignore', invalid='ignore'):
+        has_mid = valid & (bid > 0) & (ask > 0)
+        mid = np.where(has_mid, (bid + ask) / 2, np.nan)
+        spread = ask - bid
+        weight = np.where(has_mid & (spread > 0), 1 / spread, 0)
+    return mid, weight
+
+def get_priced_futures(futures_list: list[EquityIndexFuture], quotes: dict[str, InstrumentDataModel],
+                       value_date: dtm.date, price_type: MarketDataType = MarketDataType.MID) -> list[EquityIndexFuture]:
+    priced_futures = []
     for future in futures_list:
-        expiry = future.expiry
         if future.data_id not in quotes:
             continue
         fut_price = quotes[future.data_id][price_type]
         if not fut_price:
             continue
         future.data[value_date] = fut_price
-        option_data = hkex_server.get_options_chain(code, expiry.strftime('%m%Y'), session_type=session_type)
+        priced_futures.append(future)
+    return priced_futures
+
+def get_model_name(code: str) -> str:
+    return f'{code}-Vol'
+
+def get_error_message(ex: Exception) -> str:
+    return f'{type(ex).__name__}: {ex}'
+
+def build_vol_model(code: str, futures_list: list[EquityIndexFuture], value_date: dtm.date,
+                    option_chains: dict[tuple[str, str], hkex_server.OptionChainArrays]):
+    discount_curve = analytics.get_discount_curve(value_date)
+    option_chain = []
+    for future in futures_list:
+        expiry = future.expiry
+        chain = option_chains[(code, get_option_contract_id(future))]
+        if isinstance(chain, Exception):
+            raise chain
+        call_prices, call_weights = get_mid_weights(chain.call_bid, chain.call_ask, chain.call_valid)
+        put_prices, put_weights = get_mid_weights(chain.put_bid, chain.put_ask, chain.put_valid)
+        has_call, has_put = ~np.isnan(call_prices), ~np.isnan(put_prices)
         strike_lines = []
-        for strike, strike_info in option_data.items():
+        for i, strike in enumerate(chain.strikes.tolist()):
             call_option = CallOption(future, expiry, strike)
             put_option = PutOption(future, expiry, strike)
-            call_weight, put_weight = 0, 0
-            if OptionDataFlag.CALL in strike_info:
-                price = strike_info[OptionDataFlag.CALL][price_type]
-                if price:
-                    call_option.data[value_date] = price
-                    call_weight = 1 / (strike_info[OptionDataFlag.CALL][weight_type])
-            if OptionDataFlag.PUT in strike_info:
-                price = strike_info[OptionDataFlag.PUT][price_type]
-                if price:
-                    put_option.data[value_date] = price
-                    put_weight = 1 / (strike_info[OptionDataFlag.PUT][weight_type])
-            strike_lines.append(ModelStrikeLine(strike, call_option, put_option, call_weight, put_weight))
+            if has_call[i]:
+                call_option.data[value_date] = call_prices[i]
+            if has_put[i]:
+                put_option.data[value_date] = put_prices[i]
+            strike_lines.append(ModelStrikeLine(strike, call_option, put_option, call_weights[i], put_weights[i]))
         df = discount_curve.get_value(future.get_expiry_dcf(value_date))
         option_chain.append(ModelStrikeSlice(expiry, df, strike_lines))
-    return ListedOptionsConstruct(value_date, option_chain, name=f'{code}-Vol')
+    return ListedOptionsConstruct(value_date, option_chain, name=get_model_name(code))
+
+def load_all_vol_inputs(codes: list[str], session_type: SessionType = None, max_workers: int = MAX_FETCH_WORKERS,
+                        return_exceptions: bool = False):
+    "Inputs per underlying, with the exception in place of the inputs of a failed underlying if return_exceptions"
+    def load_code_inputs(code: str):
+        try:
+            return load_vol_inputs(code, session_type=session_type)
+        except Exception as ex:
+            if not return_exceptions:
+                raise
+            return ex
+    with ThreadPoolExecutor(max_workers=min(max_workers, max(len(codes), 1))) as executor:
+        return list(executor.map(load_code_inputs, codes))
+
+def build_vol_models(codes: list[str], vol_inputs: list[tuple], session_type: SessionType = None,
+                     max_workers: int = MAX_FETCH_WORKERS, return_exceptions: bool = False) -> list[ListedOptionsConstruct]:
+    "Models per underlying, with the exception in place of the model of a failed underlying if return_exceptions"
+    priced_futures, vol_models = {}, {}
+    for code, (futures_list, update_dtm, quotes) in zip(codes, vol_inputs):
+        try:
+            priced_futures[code] = get_priced_futures(futures_list, quotes, update_dtm.date())
+        except Exception as ex:
+            if not return_exceptions:
+                raise
+            vol_models[code] = ex
+    chain_keys = [(code, get_option_contract_id(future)) for code, futures in priced_futures.items() for future in futures]
+    option_chains = fetch_option_chains(chain_keys, session_type=session_type, max_workers=max_workers,
+                                        return_exceptions=return_exceptions)
+    for code, (_, update_dtm, _) in zip(codes, vol_inputs):
+        if code in vol_models:
+            continue
+        try:
+            vol_models[code] = build_vol_model(code, priced_futures[code], update_dtm.date(), option_chains)
+        except Exception as ex:
+            if not return_exceptions:
+                raise
+            vol_models[code] = ex
+    return [vol_models[code] for code in codes]
+
+def get_vol_models(codes: list[str], session_type: SessionType = None, max_workers: int = MAX_FETCH_WORKERS):
+    # futures and quotes per underlying first, then every expiry chain of every underlying at once
+    vol_inputs = load_all_vol_inputs(codes, session_type=session_type, max_workers=max_workers)
+    return build_vol_models(codes, vol_inputs, session_type=session_type, max_workers=max_workers)
+
+def get_vol_model(code: str, session_type: SessionType = None):
+    return get_vol_models([code], session_type=session_type)[0]
 
 def construct(instrument_ids: list[str]):
     # discount_curve = CurveContext().get_rate_curve('USD-SOFR', value_date)
-    return [get_vol_model(id) for id in instrument_ids]
+    return get_vol_models(instrument_ids)
+
+@dataclass
+class SurfaceResult:
+    "Picklable output of a surface build for the Dash process"
+    name: str
+    vols_graph: tuple = None
+    greeks_graph: tuple = None
+    calibration_summary: tuple = None
+    error: str = None
+    calibration_time: float = None
+
+def build_surface(vol_model: ListedOptionsConstruct, model_type: str) -> SurfaceResult:
+    try:
+        start_time = time.perf_counter()
+        vol_surface = vol_model.build(model_type)
+        calibration_time = time.perf_counter() - start_time
+        if not vol_surface:
+            return SurfaceResult(vol_model.name, calibration_time=calibration_time)
+        return SurfaceResult(vol_model.name,
+                             vols_graph=vol_model.get_vols_graph(vol_surface),
+                             greeks_graph=vol_model.get_greeks_graph(vol_surface),
+                             calibration_summary=vol_model.get_calibration_summary(vol_surface),
+                             calibration_time=calibration_time)
+    except Exception as ex:
+        return SurfaceResult(vol_model.name, error=get_error_message(ex))
+
+def build_surfaces(vol_models: list[ListedOptionsConstruct], model_type: str,
+                   max_workers: int = None) -> list[SurfaceResult]:
+    if max_workers == 1 or len(vol_models) < 2:
+        return [build_surface(vm, model_type) for vm in vol_models]
+    results = []
+    with ProcessPoolExecutor(max_workers=max_workers or len(vol_models)) as executor:
+        surface_futures = [executor.submit(build_surface, vm, model_type) for vm in vol_models]
+        for vm, future in zip(vol_models, surface_futures):
+            # a pickling error or crashed worker only fails its own surface
+            try:
+                results.append(future.result())
+            except Exception as ex:
+                results.append(SurfaceResult(vm.name, error=get_error_message(ex)))
+    return results
+
+# calibrated surfaces are shared with the other callback processes by (underlying, session, model type, quotes update time)
+SURFACE_CACHE_NAME = 'surface'
+SURFACE_HIT_STAGE = 'surface.cache.hit'
+SURFACE_MISS_STAGE = 'surface.cache.miss'
+SURFACE_BUILD_STAGE = 'surface.build'
+
+def get_surfaces(codes: list[str], model_type: str, session_type: SessionType = None,
+                 max_workers: int = None, progress: Callable[[int, int], None] = None) -> list[SurfaceResult]:
+    session_type = hkex_server.get_session_default(session_type)
+    with timing.timed('surface.load_inputs'):
+        vol_inputs = load_all_vol_inputs(codes, session_type=session_type, return_exceptions=True)
+    # a failure of one underlying only fails its own surface
+    results, pending = {}, {}
+    for code, code_inputs in zip(codes, vol_inputs):
+        if isinstance(code_inputs, Exception):
+            results[code] = SurfaceResult(get_model_name(code), error=get_error_message(code_inputs))
+            continue
+        cache_key = RESULT_CACHE.get_key(SURFACE_CACHE_NAME, (code, session_type, model_type, code_inputs[1]))
+        start_time = time.perf_counter()
+        cached = RESULT_CACHE.get(cache_key)
+        timing.record(SURFACE_HIT_STAGE if cached else SURFACE_MISS_STAGE, time.perf_counter() - start_time)
+        if cached:
+            results[code] = cached
+        else:
+            pending[code] = (cache_key, code_inputs)
+    if progress:
+        progress(len(results), len(codes))
+    if pending:
+        pending_codes = list(pending)
+        with timing.timed('surface.vol_models'):
+            vol_models = build_vol_models(pending_codes, [pending[c][1] for c in pending_codes], session_type=session_type,
+                                          return_exceptions=True)
+        for code, vol_model in zip(pending_codes, vol_models):
+            if isinstance(vol_model, Exception):
+                results[code] = SurfaceResult(get_model_name(code), error=get_error_message(vol_model))
+                del pending[code]
+        pending_codes = list(pending)
+        vol_models = [vm for vm in vol_models if not isinstance(vm, Exception)]
+        if progress:
+            progress(len(results), len(codes))
+        for code, res in zip(pending_codes, build_surfaces(vol_models, model_type, max_workers=max_workers)):
+            results[code] = res
+            if progress:
+                progress(len(results), len(codes))
+            if res.error:
+                continue
+            RESULT_CACHE.set(pending[code][0], res)
+            if res.calibration_time is not None:
+                # builds run in worker processes so the time measured there is recorded here
+                timing.record(SURFACE_BUILD_STAGE, res.calibration_time)
+                timing.record(f'{SURFACE_BUILD_STAGE}.{code}', res.calibration_time)
+    return [results[code] for code in codes]
+
+def get_surface_cache_stats() -> dict[str, any]:
+    "Surface cache hit rate and calibration times merged across the callback processes"
+    stages = timing.load_stats()
+    hits, misses = [stages[name].count if name in stages else 0 for name in (SURFACE_HIT_STAGE, SURFACE_MISS_STAGE)]
+    code_prefix = f'{SURFACE_BUILD_STAGE}.'
+    return {
+        'hits': hits, 'misses': misses,
+        'hit_rate': hits / (hits + misses) if hits + misses else 0,
+        'calibration_time': {name[len(code_prefix):]: {'mean': stage.total / stage.count, 'max': stage.max, 'count': stage.count}
+                             for name, stage in stages.items() if name.startswith(code_prefix) and stage.count},
+    }
 
 def get_vol_surface_data(code: str, model_type: str):
     vol_model = get_vol_model(code)
@@ -1,12 +1,14 @@
 import pandas as pd
+import numpy as np
 import datetime as dtm
+from typing import Callable
 import logging
 
 from common.models.market_data import MarketDataType, SessionType
 from data_api import hkex_client
 from lib import analytics
 from instruments.stock import Stock, BaseInstrument
-from instruments.equity_index import EquityIndex
+from instruments.equity_index import EquityIndex, EquityIndexFuture
 
 logger = logging.Logger(__name__)
 
@@ -15,6 +17,19 @@ BASE_PRICE = 100
 def get_data_slice(instrument: BaseInstrument, from_date: dtm.date, to_date: dtm.date = None):
     return pd.Series({k: instrument.data[k] for k in instrument.data.irange(from_date, to_date)})
 
+def get_array_slice(panel: pd.DataFrame, from_date: dtm.date, to_date: dtm.date = None) -> tuple[np.ndarray, np.ndarray]:
+    # basic slicing on the sorted date index returns views into the panel values
+    dates = panel.index.to_numpy()
+    start = np.searchsorted(dates, np.datetime64(from_date, 'ns'), side='left')
+    end = np.searchsorted(dates, np.datetime64(to_date, 'ns'), side='right') if to_date else len(dates)
+    return dates[start:end], panel.to_numpy()[start:end]
+
+def get_panel_slice(panel: pd.DataFrame, instruments: list[BaseInstrument],
+                    from_date: dtm.date, to_date: dtm.date = None) -> pd.DataFrame:
+    dates, values = get_array_slice(panel, from_date, to_date)
+    columns = panel.columns.get_indexer([inst.data_id for inst in instruments])
+    return pd.DataFrame(values[:, columns], index=dates, columns=[inst.name for inst in instruments])
+
 def get_return(instrument: BaseInstrument, from_date: dtm.date, to_date: dtm.date = None):
     try:
         from_price = instrument.data.get_latest_value(from_date)
@@ -32,22 +47,29 @@ def get_returns(instruments: list[BaseInstrument], from_date: dtm.date, to_date:
     return {inst.name: get_return(inst, from_date, to_date) for inst in instruments}
 
 def get_stocks_beta(stocks: list[Stock], benchmarks: list[EquityIndex],
-                    from_date: dtm.date, to_date: dtm.date = None):
+                    from_date: dtm.date, to_date: dtm.date = None, panel: pd.DataFrame = None):
+    if panel is not None:
+        betas = analytics.get_beta_matrix_batched(get_panel_slice(panel, stocks, from_date, to_date),
+                                                  get_panel_slice(panel, benchmarks, from_date, to_date))
+        return betas
     index_data = {}
     stocks_data = {}
     for bi in benchmarks:
         index_data[bi.name] = get_data_slice(bi, from_date, to_date)
     for si in stocks:
         stocks_data[si.name] = get_data_slice(si, from_date, to_date)
-    betas = analytics.get_beta_matrix(pd.DataFrame(stocks_data), pd.DataFrame(index_data))
+    betas = analytics.get_beta_matrix_batched(pd.DataFrame(stocks_data), pd.DataFrame(index_data))
     return betas
 
 
-def get_lag_correlations(stocks: list[Stock], from_date: dtm.date, to_date: dtm.date = None):
+def get_lag_correlations(stocks: list[Stock], from_date: dtm.date, to_date: dtm.date = None,
+                         panel: pd.DataFrame = None):
+    if panel is not None:
+        return analytics.get_autocorrelation_batched(get_panel_slice(panel, stocks, from_date, to_date))
     stocks_data = {}
     for si in stocks:
         stocks_data[si.name] = get_data_slice(si, from_date, to_date)
-    correls = analytics.get_autocorrelation(stocks_data)
+    correls = analytics.get_autocorrelation_batched(stocks_data)
     return correls
 
 
@@ -68,34 +90,66 @@ def get_stock_intraday_data(stocks: list[Stock], benchmarks: list[EquityIndex],
     return stocks_data
 
 
-def get_index_futures_spread(idx: EquityIndex):
-    futures_data = {}
-    spots_data = {}
-    spreads_data = {}
-    index_ticks = pd.Series(hkex_client.get_intraday_data(idx.data_id))
-    if index_ticks.empty:
-        logger.error('No underlying spot ticks to calculate spread')
-    trade_date = index_ticks.index[-1].date()
+NUM_SPREAD_FUTURES = 2
+
+def compute_futures_spreads(index_ticks: pd.Series, futures_ticks: dict[str, pd.Series],
+                            hedge_ratios: dict[str, float]) -> tuple[pd.DataFrame, pd.DataFrame]:
+    "Spot equivalent prices and spreads to the index for futures ticks aligned on a shared time index"
+    futures_df = pd.concat(futures_ticks, axis=1).sort_index()
+    spots_df = futures_df / np.array([hedge_ratios[fut_key] for fut_key in futures_df.columns])
+    index_values = index_ticks.reindex(futures_df.index).to_numpy()
+    spreads_df = pd.DataFrame(futures_df.to_numpy() / index_values[:, None] - 1,
+                              index=futures_df.index, columns=futures_df.columns)
+    return spots_df, spreads_df
+
+def load_futures_ticks(futures_lists: dict[SessionType, list[EquityIndexFuture]],
+                       trade_date: dtm.date) -> tuple[dict[str, pd.Series], dict[str, dtm.date]]:
+    futures_ticks, expiries = {}, {}
     for session_type in SessionType:
-        futures_list = hkex_client.get_futures_contracts(idx.derivatives_id, session_type=session_type)
         num_futures_loaded = 0
-        for future in futures_list:
-            if future.expiry < trade_date or num_futures_loaded >= 2:
+        for future in futures_lists[session_type]:
+            if future.expiry < trade_date or num_futures_loaded >= NUM_SPREAD_FUTURES:
                 continue
-            fut_key = future.name
             future_ticks = pd.Series(hkex_client.get_intraday_data(future.data_id))
             if future_ticks.empty:
                 continue
             num_futures_loaded += 1
-            if fut_key in futures_data:
-                futures_data[fut_key] = pd.concat([futures_data[fut_key], future_ticks])
-                continue
+            fut_key = future.name
+            if fut_key in futures_ticks:
+                futures_ticks[fut_key] = pd.concat([futures_ticks[fut_key], future_ticks])
             else:
-                futures_data[fut_key] = future_ticks
-            hedge_ratio = analytics.get_hedge_ratio(trade_date, future.expiry)
-            prices_spot = {k: v / hedge_ratio for k, v in future_ticks.items()}
-            spots_data[f'{fut_key} Spot'] = pd.Series(prices_spot)
-            spread_ticks = future_ticks.combine(index_ticks, lambda x, y : x/y-1).dropna()
-            spreads_data[fut_key] = spread_ticks
+                futures_ticks[fut_key] = future_ticks
+                expiries[fut_key] = future.expiry
+    return futures_ticks, expiries
+
+def get_futures_spread(idx: EquityIndex, futures_lists: dict[SessionType, list[EquityIndexFuture]]):
+    index_ticks = pd.Series(hkex_client.get_intraday_data(idx.data_id))
+    if index_ticks.empty:
+        logger.error('No underlying spot ticks to calculate spread')
+        return {}, {}
+    trade_date = index_ticks.index[-1].date()
+    futures_ticks, expiries = load_futures_ticks(futures_lists, trade_date)
+    if not futures_ticks:
+        return {idx.name: index_ticks}, {}
+    hedge_ratios = {k: analytics.get_hedge_ratio(trade_date, expiry) for k, expiry in expiries.items()}
+    spots_df, spreads_df = compute_futures_spreads(index_ticks, futures_ticks, hedge_ratios)
+    spots_data = {f'{k} Spot': spots_df[k].dropna() for k in spots_df.columns}
+    spreads_data = {k: spreads_df[k].dropna() for k in spreads_df.columns}
     spots_data[idx.name] = index_ticks
-    return futures_data | spots_data, spreads_data
+    return dict(futures_ticks) | spots_data, spreads_data
+
+def get_index_futures_spreads(indices: list[EquityIndex], progress: Callable[[int, int], None] = None
+                              ) -> dict[str, tuple[dict[str, pd.Series], dict[str, pd.Series]]]:
+    contracts = hkex_client.get_index_futures_contracts(indices)
+    indices = [idx for idx in indices if idx.derivatives_id]
+    spreads = {}
+    for idx in indices:
+        if progress:
+            progress(len(spreads), len(indices))
+        spreads[idx.name] = get_futures_spread(idx, contracts[idx.derivatives_id])
+    if progress:
+        progress(len(spreads), len(indices))
+    return spreads
+
+def get_index_futures_spread(idx: EquityIndex):
+    return get_index_futures_spreads([idx])[idx.name]
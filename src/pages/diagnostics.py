@@ -0,0 +1,109 @@
+import dash
+from dash import html, callback, ctx, Output, Input, dcc
+import dash_ag_grid as dag
+import plotly.graph_objects as go
+
+from common.app import style
+
+from lib import timing
+
+dash.register_page(__name__)
+
+DIV_STYLE = style.get_div_style()
+DROPDOWN_STYLE = style.get_dropdown_style()
+FORM_STYLE = style.get_form_style()
+GRAPH_STYLE = style.get_graph_style()
+GRID_STYLE = style.get_grid_style()
+PROFILE_OPTION = 'profile'
+BUCKET_LABELS = [f'<= {b * 1e3:g}ms' for b in timing.BUCKET_BOUNDS] + [f'> {timing.BUCKET_BOUNDS[-1] * 1e3:g}ms']
+
+layout = html.Div([
+    html.Div([
+        html.Button('Refresh', id='refresh_timings'),
+        html.Button('Reset', id='reset_timings'),
+        dcc.Checklist([{'label': 'Profile callbacks', 'value': PROFILE_OPTION}], id='profile-checklist'),
+        html.Div(id='profile-status'),
+    ], style=FORM_STYLE),
+    dcc.Tabs(children=[
+        dcc.Tab(children=html.Div([
+            dag.AgGrid(id='timings-grid', rowData=[], columnDefs=[], **GRID_STYLE),
+        ], style=DIV_STYLE), label='Stages'),
+        dcc.Tab(children=html.Div([
+            html.Div([dcc.Dropdown(id='stage-dropdown')], style=DROPDOWN_STYLE),
+            dcc.Graph(id='stage-histogram', style=GRAPH_STYLE),
+        ], style=DIV_STYLE), label='Latency'),
+        dcc.Tab(children=html.Div([
+            html.Div([dcc.Dropdown(id='profile-dropdown')], style=DROPDOWN_STYLE),
+            html.Pre(id='profile-text'),
+        ], style=DIV_STYLE), label='Profiles'),
+        dcc.Tab(children=html.Div([
+            html.Div(id='surface-cache-status'),
+            dag.AgGrid(id='surface-grid', rowData=[], columnDefs=[], **GRID_STYLE),
+        ], style=DIV_STYLE), label='Surfaces'),
+    ]),
+])
+
+@callback(
+    Output(component_id='timings-grid', component_property='rowData'),
+    Output(component_id='timings-grid', component_property='columnDefs'),
+    Output(component_id='stage-dropdown', component_property='options'),
+    Output(component_id='profile-dropdown', component_property='options'),
+    Output(component_id='profile-checklist', component_property='value'),
+    Output(component_id='surface-cache-status', component_property='children'),
+    Output(component_id='surface-grid', component_property='rowData'),
+    Output(component_id='surface-grid', component_property='columnDefs'),
+    Input(component_id='refresh_timings', component_property='n_clicks'),
+    Input(component_id='reset_timings', component_property='n_clicks'),
+)
+def load_timings(*_):
+    if ctx.triggered_id == 'reset_timings':
+        timing.reset()
+    rows = timing.get_stats_rows()
+    columns = [dict(field='Stage')] + [
+        dict(field=col, valueFormatter=style.get_grid_number_format(',.0f' if col == 'Count' else ',.3f'))
+        for col in (rows[0] if rows else {}) if col != 'Stage'
+    ]
+    profile_value = [PROFILE_OPTION] if timing.is_profiling() else []
+    return rows, columns, [row['Stage'] for row in rows], list(timing.load_profiles()), profile_value, *load_surface_stats()
+
+def load_surface_stats() -> tuple[str, list[dict[str, any]], list[dict[str, any]]]:
+    from market import hk_eq_vol
+    stats = hk_eq_vol.get_surface_cache_stats()
+    status = f"Surface cache: {stats['hits']} hits, {stats['misses']} misses, hit rate {stats['hit_rate']:.1%}"
+    rows = [{
+        'Underlying': code, 'Builds': times['count'],
+        'Mean (s)': times['mean'], 'Max (s)': times['max'],
+    } for code, times in sorted(stats['calibration_time'].items())]
+    columns = [dict(field='Underlying')] + [
+        dict(field=col, valueFormatter=style.get_grid_number_format(',.0f' if col == 'Builds' else ',.3f'))
+        for col in ('Builds', 'Mean (s)', 'Max (s)')
+    ]
+    return status, rows, columns
+
+@callback(
+    Output(component_id='profile-status', component_property='children'),
+    Input(component_id='profile-checklist', component_property='value'),
+    prevent_initial_call=True,
+)
+def set_profiling(values: list[str]):
+    timing.set_profiling(PROFILE_OPTION in (values or []))
+    return 'Profiling on' if timing.is_profiling() else None
+
+@callback(
+    Output(component_id='stage-histogram', component_property='figure'),
+    Input(component_id='stage-dropdown', component_property='value'),
+)
+def load_histogram(stage_name: str):
+    stage = timing.load_stats().get(stage_name) if stage_name else None
+    fig = go.Figure(go.Bar(x=BUCKET_LABELS, y=stage.buckets if stage else [0] * len(BUCKET_LABELS)))
+    fig.update_layout(title=stage_name or 'Latency', xaxis_title='Latency', yaxis_title='Calls')
+    return fig
+
+@callback(
+    Output(component_id='profile-text', component_property='children'),
+    Input(component_id='profile-dropdown', component_property='value'),
+)
+def load_profile(profile_name: str):
+    if not profile_name:
+        return None
+    return timing.load_profiles().get(profile_name)
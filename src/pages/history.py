@@ -6,12 +6,15 @@ import pandas as pd
 
 from common.app import style
 
+from lib.result_cache import RESULT_CACHE
+from lib import timing
 import main
 
 dash.register_page(__name__, path='/')
 
 DIV_STYLE = style.get_div_style()
 GRID_STYLE = style.get_grid_style()
+ANALYTICS_TTL = 3600
 
 layout = html.Div([
     html.Div([
@@ -21,6 +24,7 @@ layout = html.Div([
         ),
         dcc.Input(id='tenors-input', placeholder='Tenors', type='text', debounce=True),
         html.Button('Load Analytics', id='load_analytics'),
+        html.Progress(id='analytics-progress', value='0', max='1'),
         dcc.Loading(
             id='analytics-table-status',
             type='default',
@@ -38,12 +42,22 @@ def get_tuple_format(fmt: str):
     State(component_id='val-date-picker', component_property='date'),
     State(component_id='tenors-input', component_property='value'),
     Input(component_id='load_analytics', component_property='n_clicks'),
+    background=True,
+    running=[(Output(component_id='load_analytics', component_property='disabled'), True, False)],
+    progress=[
+        Output(component_id='analytics-progress', component_property='value'),
+        Output(component_id='analytics-progress', component_property='max'),
+    ],
 )
-def load_analytics(date_str: str, tenors_str: str, *_):
+@timing.instrument_callback('load_analytics')
+def load_analytics(set_progress, date_str: str, tenors_str: str, *_):
     tabvals = []
     date_select = dtm.date.fromisoformat(date_str) if date_str else None
     tenors = [t.strip() for t in tenors_str.split(',')] if tenors_str else None
-    table_dict = main.get_analytics_table(date_select, tenors)
+    table_dict = RESULT_CACHE.get_or_compute(
+        'analytics', (date_select, tuple(tenors or ()), dtm.date.today()),
+        lambda: main.get_analytics_table(date_select, tenors, progress=lambda n, total: set_progress((str(n), str(total)))),
+        ttl=ANALYTICS_TTL)
     for label, table in table_dict.items():
         values_df = pd.DataFrame(table).reset_index(names=['Name'])
         values_cols = [dict(field=col) for col in values_df.columns]
@@ -4,9 +4,10 @@ import dash_ag_grid as dag
 import logging
 
 from common.app import style, plotter
-from volatility.lib import plotter as vol_plotter
 from volatility.models.vol_types import VolatilityModelType
 
+from lib.result_cache import RESULT_CACHE
+from lib import timing
 import main
 
 logger = logging.Logger(__name__)
@@ -17,6 +18,9 @@ DROPDOWN_STYLE = style.get_dropdown_style()
 FORM_STYLE = style.get_form_style()
 GRAPH_STYLE = style.get_graph_style()
 GRID_STYLE = style.get_grid_style()
+# in line with the chain and chart snapshot intervals
+OPTIONS_TTL = 60
+FUTURES_TTL = 60
 
 layout = html.Div([
     dcc.Tabs(children=[
@@ -24,6 +28,7 @@ layout = html.Div([
             html.Div([
                 html.Button('Load Futures', id='load_futures'),
             ], style=FORM_STYLE),
+            html.Progress(id='futures-progress', value='0', max='1'),
             dcc.Loading(
                 id='futures-spreads-status',
                 type='default',
@@ -37,6 +42,7 @@ layout = html.Div([
                 ], style=DROPDOWN_STYLE),
                 html.Button('Load Option Surfaces', id='load_options'),
             ], style=FORM_STYLE),
+            html.Progress(id='option-surfaces-progress', value='0', max='1'),
             dcc.Loading(
                 id='option-surfaces-status',
                 type='default',
@@ -52,20 +58,34 @@ layout = html.Div([
     Input(component_id='model-type-dropdown', component_property='value'),
     Input(component_id='load_options', component_property='n_clicks'),
     prevent_initial_call=True,
+    background=True,
+    running=[(Output(component_id='load_options', component_property='disabled'), True, False)],
+    progress=[
+        Output(component_id='option-surfaces-progress', component_property='value'),
+        Output(component_id='option-surfaces-progress', component_property='max'),
+    ],
 )
-def load_options(model_type: str, *_):
+@timing.instrument_callback('load_options')
+def load_options(set_progress, model_type: str, *_):
+    from volatility.lib import plotter as vol_plotter
     try:
         tabvals = []
-        for vsm in main.get_option_models():
+        surface_results = RESULT_CACHE.get_or_compute(
+            'option_surfaces', (model_type,),
+            lambda: main.get_option_surfaces(model_type, progress=lambda n, total: set_progress((str(n), str(total)))),
+            ttl=OPTIONS_TTL)
+        for vsr in surface_results:
+            if vsr.error:
+                logger.error(f'Exception in Surface {vsr.name}: {vsr.error}')
+                continue
+            if vsr.vols_graph is None:
+                continue
             try:
-                vs = vsm.build(model_type)
-                if not vs:
-                    continue
-                vs_fig = vol_plotter.get_surface_figure(*vsm.get_vols_graph(vs))
-                gr_fig = vol_plotter.get_surface_figure(*vsm.get_greeks_graph(vs), title='Greeks', mesh_ids=[])
-                rows, colnames = vsm.get_calibration_summary(vs)
+                vs_fig = vol_plotter.get_surface_figure(*vsr.vols_graph)
+                gr_fig = vol_plotter.get_surface_figure(*vsr.greeks_graph, title='Greeks', mesh_ids=[])
+                rows, colnames = vsr.calibration_summary
             except Exception as ex:
-                logger.error(f'Exception in Surface {vsm.name}: {ex}')
+                logger.error(f'Exception in Surface {vsr.name}: {ex}')
                 continue
             columns = [dict(field=col) for col in colnames]
             records = [dict(zip(colnames, row)) for row in rows]
@@ -76,7 +96,7 @@ def load_options(model_type: str, *_):
                     rowData=records, columnDefs=columns,
                     **GRID_STYLE
                 ),
-            ], label=vsm.name))
+            ], label=vsr.name))
         return dcc.Tabs(children=tabvals), None
     except Exception as ex:
         logger.critical(f'Exception in Models: {ex}')
@@ -86,11 +106,22 @@ def load_options(model_type: str, *_):
     Output(component_id='futures-spreads', component_property='children'),
     Output(component_id='futures-spreads-status', component_property='children'),
     Input(component_id='load_futures', component_property='n_clicks'),
+    background=True,
+    running=[(Output(component_id='load_futures', component_property='disabled'), True, False)],
+    progress=[
+        Output(component_id='futures-progress', component_property='value'),
+        Output(component_id='futures-progress', component_property='max'),
+    ],
 )
-def load_futures(*_):
+@timing.instrument_callback('load_futures')
+def load_futures(set_progress, *_):
     try:
         tabvals = []
-        for label, graph_data, kwargs in main.get_futures_data():
+        futures_data = RESULT_CACHE.get_or_compute(
+            'futures_spreads', (),
+            lambda: list(main.get_futures_data(progress=lambda n, total: set_progress((str(n), str(total))))),
+            ttl=FUTURES_TTL)
+        for label, graph_data, kwargs in futures_data:
             fig = plotter.get_figure(*graph_data, **kwargs)
             tabvals.append(dcc.Tab(children=[
                 dcc.Graph(figure=fig, style=GRAPH_STYLE),